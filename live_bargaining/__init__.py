@@ -1,8 +1,12 @@
 from .constants import *
 from .models import *
 from .pages import *
+from .heartbeat import patch_heartbeat
+from .serializer import patch_channels
 from .session_patch import patch_session
 
 patch_session()
+patch_heartbeat()
+patch_channels()
 
 doc = """"""
@@ -1,10 +1,14 @@
+import asyncio
 from functools import cached_property
-from typing import Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from otree.database import db
 from otree.models import Participant, Session
+from sqlalchemy import inspect
 
 from .constants import C, Config
+from .db_writer import DB_WRITER
+from .debug_log import DebugLog
 from .offer import Offer, OfferList
 
 
@@ -20,7 +24,7 @@ class InteractionList(list):
 
 class BotBase:
     def __init__(self):
-        self.client = None
+        self.clients: Dict[str, 'AsyncClient'] = {}
         self.config: Optional[Config] = None
         self.role: Optional[str] = None
         self.user_message: Optional[str] = None
@@ -28,11 +32,17 @@ class BotBase:
         self.interaction_list: Optional[InteractionList] = None
         self.offer_list: Optional[OfferList] = None
         self.optimal_offer = None
+        # Number of offers and interactions already in the database
+        self.stored_offers = 0
+        self.stored_interactions = 0
+        # Objects looked up during a turn, the async tasks have no self.player
+        self.identity_map: Optional[Dict[Tuple, Any]] = None
+        # Operations submitted to the DB writer, awaited at the end of a turn
+        self.pending_writes: List[asyncio.Future] = []
 
         # The Player must be able to set these, but they will be ignored
         self.price_proposed = None
         self.price_accepted = None
-        self.offers = None
         self.time_end = None
 
     @staticmethod
@@ -57,14 +67,73 @@ class BotBase:
     def add_profits(self, offer: Offer):
         offer.profits(self.role, self.constraint_user, self.constraint_bot)
 
+    def _identity(self, key: Tuple, lookup: Callable[[], Any]) -> Any:
+        """ Looked up once per turn, again if another database session is
+        current, e.g. a request started while the turn was waiting """
+        if self.identity_map is None:
+            return lookup()
+        value = self.identity_map.get(key)
+        first = value[0] if isinstance(value, tuple) else value
+        if value is None or inspect(first).session is not db._db:
+            value = self.identity_map[key] = lookup()
+        return value
+
+    def _owning_sessions(self) -> List[Any]:
+        """ The current session and those of the objects looked up """
+        sessions = [db._db]
+        for value in (self.identity_map or {}).values():
+            for obj in value if isinstance(value, tuple) else [value]:
+                session = inspect(obj).session
+                if session is not None and session not in sessions:
+                    sessions.append(session)
+        return sessions
+
     def get_session(self) -> Session:
-        return db.query(Session) \
-            .filter_by(code=self.config['session_code']).one()
+        return self._identity(
+            ('session', self.config['session_code']),
+            lambda: db.query(Session)
+            .filter_by(code=self.config['session_code']).one())
 
     def get_player_participant(self) -> Tuple['Player', Participant]:
-        participant = db.query(
-            Participant).filter_by(code=self.config['code']).one()
-        return participant._get_current_player(), participant
+        def lookup():
+            participant = db.query(
+                Participant).filter_by(code=self.config['code']).one()
+            return participant._get_current_player(), participant
+
+        return self._identity(
+            ('participant', self.config['code'], self.config['round_number']),
+            lookup)
+
+    def write(self, operation: Callable[[Any], Any]):
+        """ An insert on the DB writer thread, or now in the oTree session """
+        if DB_WRITER.enabled(self.config):
+            self.pending_writes.append(
+                asyncio.ensure_future(DB_WRITER.submit(operation)))
+        else:
+            operation(db)
+
+    async def drain_writes(self):
+        pending, self.pending_writes = self.pending_writes, []
+        for result in await asyncio.gather(*pending, return_exceptions=True):
+            if isinstance(result, Exception):
+                self.add_debug_log(f"DB writer error: {result}")
+
+    def begin_work(self):
+        self.identity_map = {}
+
+    def commit(self):
+        """ Also the sessions of objects looked up before a request started """
+        for session in self._owning_sessions():
+            try:
+                session.commit()
+            except Exception:
+                session.rollback()
+                raise
+
+    def flush_work(self):
+        """ The debug lines of the turn in one insert and commit """
+        self.identity_map = None
+        self.flush_debug_log()
 
     def constraint_in_range(self, constraint_user: Optional[int]) -> bool:
         if constraint_user is None:
@@ -90,8 +159,18 @@ class BotBase:
 
     def add_debug_log(self, message: str):
         try:
-            debug_log = self.get_session().debug_log
-            debug_log[self.config['round_number']].append(message)
+            DebugLog.add(self.config['session_code'],
+                         self.config['round_number'], message)
+        except Exception as e:
+            return
+        # During a turn the lines are written by flush_work
+        if self.identity_map is None:
+            self.flush_debug_log()
+
+    def flush_debug_log(self):
+        try:
+            DebugLog.flush(self.config['session_code'],
+                           self.config['round_number'])
             db.commit()
         except Exception as e:
             return
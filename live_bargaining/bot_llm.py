@@ -1,16 +1,25 @@
 import asyncio
 import re
 import logging
-from typing import Any, Dict, Optional
+import time
+from typing import Any, Dict, List, Optional
 
 import httpx
 from ollama import AsyncClient
-from otree.channels import utils as channel_utils
-from otree.database import db
 
 from .constants import C
+from .conversation import estimate_tokens
+from .fair_queue import (NoHostAvailable, PRIORITY_INTERPRET,
+                         PRIORITY_GENERATE, PRIORITY_WARMUP)
+from .host_health import HostHealth
+from .micro_batch import MicroBatch
 from .offer import Offer
+from .outbox import OUTBOX
+from .post_process import pipeline_for, post_process
+from .prefix_cache import PREFIX_CACHE
 from .prompts import PROMPTS, system_final_prompt
+from .response_cache import RESPONSE_CACHE
+from .single_flight import SingleFlight
 
 
 class BotLLM:
@@ -19,8 +28,10 @@ class BotLLM:
         self.role = None
         self.interaction_list = None
         self.offer_list = None
-        self.client = None
+        self.clients = None
         self.config = None
+        self.add_debug_log = None
+        self.time_left = None
 
         self.role = None
         self.role = None
@@ -29,8 +40,8 @@ class BotLLM:
         raise RuntimeError
 
     def send_asyncio_data(self, data: Dict[str, Any]):
-        asyncio.create_task(channel_utils.group_send(
-            group=self.config['group_name'], data=data))
+        OUTBOX.add(self.config['group_name'], data,
+                   self.config.get('channel_flush_window', 0))
 
     def store_send_data(self,
                         llm_output: str = None,
@@ -47,128 +58,244 @@ class BotLLM:
             self.send_asyncio_data(data)
             self.interaction_list.add_bot_message(llm_output)
 
-        # Store and send interactions
-        if self.interaction_list:
-            player.llm_interactions = self.interaction_list
-            self.send_asyncio_data({'interactions': self.interaction_list})
-
-        # Store and send offers
-        if self.offer_list:
-            player.offers = self.offer_list
-            self.send_asyncio_data({'offers': self.offer_list})
+        from live_bargaining.models import (InteractionRecord, OfferRecord,
+                                            add_records, delta, offer_rows)
+        player_id = player.id
 
-        db.commit()
+        # Store new interactions, the browser does not show them
+        if self.interaction_list:
+            rows = self.interaction_list[self.stored_interactions:]
+            self.write(lambda session: add_records(
+                session, InteractionRecord, player_id, rows))
+            player.cache_records(InteractionRecord, rows)
+            self.stored_interactions = len(self.interaction_list)
+
+        # Store and send new offers, with the profits of this round
+        if len(self.offer_list) > self.stored_offers:
+            offers = [Offer(**offer)
+                      for offer in self.offer_list[self.stored_offers:]]
+            for offer in offers:
+                self.add_profits(offer)
+            rows = offer_rows(offers)
+            self.write(lambda session: add_records(
+                session, OfferRecord, player_id, rows))
+            player.cache_records(OfferRecord, rows)
+            self.send_asyncio_data(
+                {'offers_delta': delta(self.offer_list, self.stored_offers)})
+            self.stored_offers = len(self.offer_list)
+
+        self.commit()
+
+    def store_bot_vars(self, bot_vars: Dict[str, Any]):
+        # Only bot_vars, the lists of a background task may be outdated
+        player, participant = self.get_player_participant()
+        player.bot_vars = {**player.bot_vars, **bot_vars}
+        self.commit()
 
     @staticmethod
     def extract_content(response: Dict[str, Any]) -> str:
-        def remove_inner(string: str, start_char: str, end_char: str):
-            while start_char in string and end_char in string:
-                start_pos = string.find(start_char)
-                end_pos = string.find(end_char, start_pos) + 1
-                if 0 <= start_pos < end_pos:
-                    string = string[:start_pos] + string[end_pos:]
-                else:
-                    break
-            return string
-        
-        def clean_leading_non_alphanum(s: str) -> str:
-            # Remove all leading characters that are not a-z, A-Z, or 0-9
-            return re.sub(r'^[^a-zA-Z0-9]+', '', s)
-
         try:
-            content: str = response['message']['content'].strip()
+            content: str = response['message']['content']
         except KeyError as _:
             print(f"\nUnexpected response format: {response}\n")
             return f"\nUnexpected response format: {response}\n"
 
-        # Extract text within the quotes if quotes are found
-        if content.count('"') > 1:
-            start = content.find('"') + 1
-            end = content.rfind('"')
-            x = content[start:end]
-            # Prevent cases in which user introduces parameters inside ""
-            if len(x) > 30:
-                content = x
-        else:
-        # Remove 'System" starts
-            if content.lower().startswith("system:"):
-                content = content[7:].strip()
-            if content.lower().startswith("system,"):
-                content = content[7:].strip()
-
-        # Remove text within parentheses if no quotes are found
-        content = remove_inner(content, '(', ')')
-        # Remove content within square brackets
-        #content = remove_inner(content, '[', ']')
-
-        s = 0
-
-        # Remove text before "optimal_offer"
-        if 'optimal_offer' in content and s != 3:
-            split_list = content.split('optimal_offer', 1)
-            content = split_list[1].strip() if len(split_list) > 1 else content
-            s+=1
-
-        s = 0
-
-        # Remove text before the first colon
-        while ':' in content and s != 3:
-            split_list = content.split(':', 1)
-            content = split_list[1].strip() if len(split_list) > 1 else content
-            s+=1
-
-        s = 0
-
-        # Remove internal thoughts
-        while 'Here is the most efficient offer' in content and s != 3:
-            split_list = content.split('Here is the most efficient offer', 1)
-            content = split_list[1].strip() if len(split_list) > 1 else content
-            s+=1
-
-        s = 0
-
-        while 'response' in content and s != 3:
-            split_list = content.split('response', 1)
-            content = split_list[1].strip() if len(split_list) > 1 else content
-            s+=1
-
-        # Cleaning text from leaading non-alphanumeric characters
-        content = clean_leading_non_alphanum(content)
-        # Split the content at line breaks and take only the first part
-        content = content.split('\n', 1)[0]
-        content = content.strip()
-        content = content.strip('"')
-
+        content, _ = post_process(content, pipeline_for(response.get('model')))
         return content
 
     ############################################################################
     # Methods that use the LLMs
     ############################################################################
-    def _ensure_client(self):
-        if self.client is None:
+    def _client(self, llm_host: str) -> AsyncClient:
+        if llm_host not in self.clients:
             logging.getLogger("httpx").level = logging.WARNING
             auth = httpx.BasicAuth(username=self.config['llm_user'],
                                    password=self.config['llm_pass'])
-            self.client = AsyncClient(host=self.config['llm_host'], auth=auth)
-
-    async def get_llm_response(self, content: str) -> Dict[str, Any]:
-        # Ensure we have a client
-        self._ensure_client()
+            self.clients[llm_host] = AsyncClient(
+                host=llm_host, auth=auth,
+                timeout=self.config.get('llm_timeout'))
+        return self.clients[llm_host]
+
+    async def _timed_chat(self, llm_host: str, backup: bool = False,
+                          **kwargs) -> Dict[str, Any]:
+        health = HostHealth.get(llm_host)
+        probe = health.start_call()
+        start = time.monotonic()
+        try:
+            response = await self._client(llm_host).chat(
+                keep_alive=self.config.get('llm_keep_alive'), **kwargs)
+        except asyncio.CancelledError:
+            # A losing backup was cut short, its time says nothing
+            health.record_cancel(
+                None if backup else time.monotonic() - start, probe)
+            raise
+        except Exception as e:
+            if health.record_failure(self.config):
+                self.add_debug_log(f"Circuit opened for {llm_host}: {e}")
+            raise
+        health.record_success(time.monotonic() - start)
+        return response
+
+    async def _chat(self, priority: int, **kwargs) -> Dict[str, Any]:
+        """ All LLM calls go through here """
+        if not self.config.get('llm_single_flight'):
+            return await self._batched_chat(priority, **kwargs)
+
+        key = SingleFlight.key(**kwargs)
+        return await SingleFlight.run(
+            key, lambda: self._batched_chat(priority, **kwargs))
+
+    async def _batched_chat(self, priority: int, **kwargs) -> Dict[str, Any]:
+        if priority != PRIORITY_INTERPRET or \
+                not self.config.get('llm_micro_batch'):
+            return await self._leased_chat(priority, **kwargs)
+
+        key = (self.config['session_code'], self.config['round_number'],
+               kwargs['model'])
+        return await MicroBatch.run(
+            key, kwargs, lambda requests: self._leased_batch(priority, requests),
+            self.config['llm_batch_window'], self.config['llm_batch_size'])
+
+    async def _acquire(self, priority: int,
+                       preferred: Optional[str] = None) -> str:
+        from live_bargaining.session_patch import Queues
+
+        # Without degraded mode, waiting is the only option
+        timeout = self.config['llm_degraded_budget'] \
+            if self.config.get('llm_degraded_mode') else 90
+        time_left = self.time_left()
+        llm_host = await Queues.acquire(
+            self.config['session_code'], self.config['round_number'],
+            timeout if time_left is None else min(timeout, time_left),
+            self.config['code'], priority, self.config.get('deadline'),
+            preferred)
+        if llm_host is None:
+            raise NoHostAvailable
+        return llm_host
+
+    async def _leased_batch(self, priority: int, requests: List[Dict[str, Any]]) \
+            -> List[Any]:
+        """ One host lease for the requests of a micro batch """
+        from live_bargaining.session_patch import Queues
+
+        llm_host = await self._acquire(priority)
+        try:
+            return await asyncio.gather(
+                *[self._timed_chat(llm_host, **kwargs) for kwargs in requests],
+                return_exceptions=True)
+        finally:
+            await Queues.release(self.config['session_code'],
+                                 self.config['round_number'], llm_host)
+
+    async def _leased_chat(self, priority: int, **kwargs) -> Dict[str, Any]:
+        """ A host is leased per call """
+        from live_bargaining.session_patch import Queues
+
+        # Prefer the host that already evaluated this system prompt
+        prefix_key = PREFIX_CACHE.key(kwargs['model'], kwargs['messages'])
+        llm_host = await self._acquire(priority,
+                                       PREFIX_CACHE.host_for(prefix_key))
 
+        try:
+            response = await self._hedged_chat(llm_host, **kwargs)
+            PREFIX_CACHE.record(
+                prefix_key, llm_host, kwargs['messages'], response)
+            return response
+        finally:
+            await Queues.release(self.config['session_code'],
+                                 self.config['round_number'], llm_host)
+
+    async def _hedged_chat(self, llm_host: str, **kwargs) -> Dict[str, Any]:
+        from live_bargaining.session_patch import Queues
+
+        primary = asyncio.ensure_future(self._timed_chat(llm_host, **kwargs))
+
+        delay = HostHealth.get(llm_host).p95
+        if not self.config.get('llm_hedging') or delay is None:
+            return await primary
+
+        # Cancelling the turn must also cancel the calls, or they keep
+        # running on hosts that are already released
+        pending = {primary}
+        backup_host = None
+        try:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if done:
+                return primary.result()
+
+            # Primary is slower than usual, duplicate on another idle host
+            backup_host = Queues.try_acquire(
+                self.config['session_code'], self.config['round_number'],
+                exclude=llm_host)
+            if backup_host is None:
+                return await primary
+
+            self.add_debug_log(f"Hedged {llm_host} ({delay:.1f}s) "
+                               f"with {backup_host}")
+            backup = asyncio.ensure_future(
+                self._timed_chat(backup_host, backup=True, **kwargs))
+            pending = {primary, backup}
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+            if backup_host is not None:
+                await Queues.release(self.config['session_code'],
+                                     self.config['round_number'], backup_host)
+
+    async def warm_up(self):
+        """ Evaluate the system prompt before the first offer comes in """
+        if not self.config.get('llm_warm_up'):
+            return
+        await self._chat(
+            PRIORITY_WARMUP,
+            model=self.config['llm_model'],
+            options={'temperature': self.config['llm_temp'], 'num_predict': 1},
+            messages=[{"role": "system",
+                       "content": system_final_prompt(self.config)}])
+
+    async def get_llm_response(self, content: str,
+                               cacheable: bool = False) -> Dict[str, Any]:
+        """ Only cacheable prompts, independent of the conversation so far,
+        use the response cache """
         assert isinstance(content, str)
         system_prompt = system_final_prompt(self.config)
         messages = [{"role": "system", "content": system_prompt},
                     {"role": "user", "content": content}]
 
-        return await self.client.chat(
+        cacheable = cacheable and self.config.get('llm_cache')
+        if cacheable:
+            key = RESPONSE_CACHE.key(
+                self.config['llm_model'], self.config['llm_temp'], messages)
+            cached = await RESPONSE_CACHE.get(key, self.config)
+            if cached is not None:
+                return {'message': {'role': 'assistant', 'content': cached}}
+
+        response = await self._chat(
+            PRIORITY_GENERATE,
             model=self.config['llm_model'],
             options={'temperature': self.config['llm_temp']},
             messages=messages)
 
-    async def interpret_constraints(self, message: str) -> Optional[int]:
-        # Ensure we have a client
-        self._ensure_client()
+        if cacheable:
+            await RESPONSE_CACHE.put(key, response['message']['content'],
+                                     self.config)
+
+        self.add_debug_log(
+            f"Prompt tokens {self.config['idx']}: "
+            f"{response.get('prompt_eval_count', '-')} "
+            f"(estimated {estimate_tokens(system_prompt + content)})")
+        return response
 
+    async def interpret_constraints(self, message: str) -> Optional[int]:
         def log(result):
             file_name = \
                 "live_bargaining/static/live_bargaining/debug/constraints.csv"
@@ -179,8 +306,9 @@ class BotLLM:
         # Make the call
         content = PROMPTS['constraints'] + message
         messages = [{'role': 'user', 'content': content}]
-        response = await self.client.chat(model=self.config['llm_constraint'],
-                                          messages=messages)
+        response = await self._chat(PRIORITY_INTERPRET,
+                                    model=self.config['llm_constraint'],
+                                    messages=messages)
         llm_output = response['message']['content']
 
         # Search for the pattern in the message, return as float
@@ -203,9 +331,6 @@ class BotLLM:
             except ValueError:
                 pass
 
-        # Ensure we have a client
-        self._ensure_client()
-
         # Defaults to User Offer
         if idx is None:
             idx = self.config['idx']
@@ -215,8 +340,9 @@ class BotLLM:
             messages = [{'role': 'user',
                         'content': PROMPTS['understanding_offer'] + message}]
             # Make the call
-            response = await self.client.chat(model=self.config['llm_reader'],
-                                            messages=messages)
+            response = await self._chat(PRIORITY_INTERPRET,
+                                        model=self.config['llm_reader'],
+                                        messages=messages)
             llm_output = response['message']['content']
             print('\n[DEBUG Bot_llm.interpret_offer]', llm_output + '\n')
         # Otherwise, output an empty offer [,] directly
@@ -8,6 +8,7 @@ from .bot_task import BotTask
 from .constants import C
 from .offer import Offer, OfferList
 from .prompts import PROMPTS
+from .utils import get_deadline
 
 
 class NegotiationBot(BotStrategy, BotTask, BotLLM):
@@ -24,6 +25,7 @@ class NegotiationBot(BotStrategy, BotTask, BotLLM):
             'code': player.participant.code,
             'session_code': player.session.code,
             'round_number': player.round_number,
+            'deadline': get_deadline(player),
             'group_name': self.group_name(player),
             'roles': {'human_role': player.role, 'bot_role': self.role},
 
@@ -47,10 +49,10 @@ class NegotiationBot(BotStrategy, BotTask, BotLLM):
         return None
 
     def start_initial(self):
-        if self.player.field_maybe_none("llm_interactions") is None:
-            self.player.llm_interactions = []
+        if not self.player.llm_interactions:
             self._offers_interactions()
             self.initial()
+            asyncio.ensure_future(self.start_background(self.warm_up))
 
     def receive_chat_from_human(self, user_message: str):
         # Received via the chat
@@ -69,7 +71,10 @@ class NegotiationBot(BotStrategy, BotTask, BotLLM):
         self.offer_list = OfferList(
             Offer(**offer) for offer in self.player.offers)
         # Create interactions list, add user message if needed
-        assert isinstance(self.player.llm_interactions, list)
         self.interaction_list = InteractionList(self.player.llm_interactions)
         self.interaction_list.add_user_message(self.user_message)
-        self.player.llm_interactions = self.interaction_list
+        if self.user_message:
+            self.player.add_interactions(self.interaction_list[-1:])
+        # Records up to here are stored, only the rest is added later
+        self.stored_offers = len(self.offer_list)
+        self.stored_interactions = len(self.interaction_list)
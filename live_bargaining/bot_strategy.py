@@ -1,15 +1,21 @@
 import asyncio
 import random
-from typing import Any, List, Union
+from typing import Any, List, Tuple, Union
 
 from .bot_base import BotBase
-from .offer import (Offer, ACCEPT, OFFER_QUALITY, OFFER_PRICE,
+from .candidate_budget import CandidateHistory, DEFAULT_PLAN
+from .offer import (Offer, parse_offer, ACCEPT, OFFER_QUALITY, OFFER_PRICE,
                     NOT_OFFER, INVALID_OFFER, NOT_PROFITABLE_FIND_OTHER_QUANTITY, NOT_PROFITABLE_FIND_OTHER_PRICE, TOO_UNFAVOURABLE)
 from .constants import C
+from .conversation import ConversationWindow
+from .fair_queue import PRIORITY_WARMUP
 from .prompts import (PROMPTS, not_profitable_prompt, empty_offer_prompt,
                       offer_without_price_prompt, offer_without_quality_prompt,
                       offer_invalid, offer_with_single_unfavourable_term_prompt)
-from .optimal import optimal_solution_string
+from .optimal import (nash_bargaining_solution, optimal_solution,
+                      optimal_solution_string)
+from .phrasings import fast_reply
+from .templates import ACCEPT_FROM_CHAT, templated_reply
 
 
 class BotStrategy(BotBase):
@@ -57,13 +63,18 @@ class BotStrategy(BotBase):
             raise Exception
 
     async def accept_offer(self):
-        if self.offer_user.from_chat:
-            content = PROMPTS['accept_from_chat'] + self.user_message
-        else:
-            content = PROMPTS['accept_from_interface'] + self.user_message
+        label = ACCEPT_FROM_CHAT if self.offer_user.from_chat else ACCEPT
+        llm_output = fast_reply(self.role, label) \
+            if self.config.get('llm_fast_accept') else None
 
-        response = await self.get_llm_response(content)
-        llm_output = self.extract_content(response)
+        if llm_output is None:
+            if self.offer_user.from_chat:
+                content = PROMPTS['accept_from_chat'] + self.user_message
+            else:
+                content = PROMPTS['accept_from_interface'] + self.user_message
+
+            response = await self.get_llm_response(content, cacheable=True)
+            llm_output = self.extract_content(response)
         self.store_send_data(llm_output=llm_output)
 
         if self.offer_user.from_chat:
@@ -71,6 +82,46 @@ class BotStrategy(BotBase):
         else:
             await self.accept_final_interface()
 
+    async def degraded_turn(self):
+        """ Answer from the numbers and templates when there is no LLM host """
+        if self.offer_user is None:
+            # The reader model was not reached either
+            self.offer_user = parse_offer(self.user_message, self.config['idx'])
+            self.offer_list.append(self.offer_user)
+        for offer in self.offer_list:
+            self.add_profits(offer)
+
+        evaluation = self.offer_user.evaluate(
+            self.constraint_bot, self.constraint_user)
+        if evaluation == ACCEPT:
+            label = ACCEPT_FROM_CHAT if self.offer_user.from_chat else ACCEPT
+            self.store_send_data(
+                llm_output=templated_reply(self.role, label))
+            if self.offer_user.from_chat:
+                await self.accept_final_chat()
+            else:
+                await self.accept_final_interface()
+            return
+
+        if evaluation == INVALID_OFFER:
+            price, quality = nash_bargaining_solution(
+                self.constraint_bot, self.constraint_user)['offer']
+        else:
+            price, quality = optimal_solution(
+                self.constraint_user, self.constraint_bot,
+                evaluation, self.offer_user)
+        if None in (price, quality):
+            evaluation = NOT_OFFER
+            price, quality = nash_bargaining_solution(
+                self.constraint_bot, self.constraint_user)['offer']
+
+        bot_offer = Offer(idx=-1, from_chat=True, price=price,
+                          quality=int(quality), test="degraded_turn")
+        self.add_profits(bot_offer)
+        self.send_response(
+            templated_reply(self.role, evaluation, price, int(quality)),
+            bot_offer)
+
     async def accept_final_chat(self):
         await asyncio.sleep(4)
         # Create offer matching offer for user to accept
@@ -87,34 +138,113 @@ class BotStrategy(BotBase):
         # Accept on the model
         player, participant = self.get_player_participant()
         player.process_accept(self.offer_user.price, self.offer_user.quality)
+        self.commit()
         # Accept in the interface
         self.send_asyncio_data({'finished': True})
 
+    def conversation(self) -> str:
+        return ConversationWindow(self.interaction_list, self.config).render()
+
+    async def summarize(self):
+        """ Summarize interactions that fell out of the conversation window """
+        window = ConversationWindow(self.interaction_list, self.config)
+        if not self.config.get('llm_summarize') or not window.to_summarize:
+            return
+
+        content = PROMPTS['summarize_conversation'] % (
+            window.summary or '(none)', str(window.to_summarize))
+        response = await self._chat(
+            PRIORITY_WARMUP,
+            model=self.config['llm_model'],
+            options={'temperature': self.config['llm_temp']},
+            messages=[{'role': 'user', 'content': content}])
+
+        bot_vars = window.summarized_vars(response['message']['content'].strip())
+        self.config['bot_vars'].update(bot_vars)
+        self.store_bot_vars(bot_vars)
+
+    def cacheable(self, evaluation: str) -> bool:
+        """ Prompts that do not depend on the conversation so far """
+        # The opening: no user message before this one
+        return evaluation == INVALID_OFFER or \
+            (evaluation == NOT_OFFER and sum(
+                interaction['role'] == 'user'
+                for interaction in self.interaction_list) <= 1)
+
     def get_respond_prompt(self, evaluation: str) -> str:
         if evaluation == NOT_OFFER:
             return empty_offer_prompt(
                 self.config, self.user_message,
-                self.optimal_offer, str(self.interaction_list))
+                self.optimal_offer, self.conversation())
         elif evaluation == TOO_UNFAVOURABLE:
             return offer_with_single_unfavourable_term_prompt(
                 self.config, self.user_message,
-                self.optimal_offer, str(self.interaction_list))
+                self.optimal_offer, self.conversation())
         elif evaluation == OFFER_QUALITY:
             return offer_without_price_prompt(
                 self.config, self.user_message,
-                self.optimal_offer, str(self.interaction_list))
+                self.optimal_offer, self.conversation())
         elif evaluation == OFFER_PRICE:
             return offer_without_quality_prompt(
                 self.config, self.user_message,
-                self.optimal_offer, str(self.interaction_list))
+                self.optimal_offer, self.conversation())
         elif evaluation == INVALID_OFFER:
             return offer_invalid(self.config, self.user_message)
         else:
             return not_profitable_prompt(
                 self.config, self.user_message,
-                self.optimal_offer, str(self.interaction_list))
+                self.optimal_offer, self.conversation())
+
+    async def phrase_counteroffer(self, evaluation: str) -> bool:
+        """ The counteroffer is computed, the LLM only phrases it once """
+        price, quality = optimal_solution(
+            self.constraint_user, self.constraint_bot,
+            evaluation, self.offer_user)
+        if None in (price, quality):
+            return False
+
+        bot_offer = Offer(idx=-1, from_chat=True, price=price,
+                          quality=int(quality), test="phrase_counteroffer")
+        self.add_profits(bot_offer)
+
+        # The prompt already contains this offer as the optimal_offer
+        response = await self.get_llm_response(
+            self.get_respond_prompt(evaluation))
+        llm_output = self.extract_content(response)
+
+        # The phrasing must contain exactly this offer, or use a template
+        phrased = parse_offer(llm_output, -1)
+        if phrased.price is None or abs(phrased.price - price) >= .005 or \
+                phrased.quality != bot_offer.quality:
+            self.add_debug_log(f"Phrasing without the counteroffer "
+                               f"{self.config['idx']}: {llm_output}")
+            llm_output = templated_reply(
+                self.role, evaluation, price, bot_offer.quality)
+
+        self.send_response(llm_output, bot_offer)
+        return True
+
+    def candidate_key(self, label: str) -> Tuple[str, str, str]:
+        return label, self.config['llm_model'], self.role
+
+    def candidate_plan(self, label: str) -> List[int]:
+        """ Prompt variant (content1 or content2) per candidate """
+        if not self.config.get('llm_adaptive_candidates'):
+            return DEFAULT_PLAN
+        return CandidateHistory.plan(self.candidate_key(label), self.config)
+
+    def record_candidate(self, label: str, position: int, variant: int,
+                         accepted: bool):
+        if self.config.get('llm_adaptive_candidates'):
+            row = CandidateHistory.record(
+                self.candidate_key(label), position, variant, accepted)
+            self.write(lambda session: session.add(row))
 
     async def respond_to_offer(self, evaluation: str):
+        if self.config.get('llm_counteroffer_engine') and \
+                await self.phrase_counteroffer(evaluation):
+            return
+
         content1 = self.get_respond_prompt(evaluation)
 
         try:
@@ -122,13 +252,16 @@ class BotStrategy(BotBase):
         except:
             content2 = content1
 
+        label = evaluation
+        plan = self.candidate_plan(label)
+        contents = {1: content1, 2: content2}
+
         llm_offers = []
         last_offer = llm_output = None
 
-        while len(llm_offers) < 3:  
-            response = await self.get_llm_response(
-
-                content1 if len(llm_offers) < 2 else content2)
+        while len(llm_offers) < len(plan):
+            variant = plan[len(llm_offers)]
+            response = await self.get_llm_response(contents[variant])
             print('\n[DEBUG Bot_strategy.respond_to_offer 1 - Bot internal message]', response['message'], "\n")
             llm_output = self.extract_content(response)
             print('\n[DEBUG Bot_strategy.respond_to_offer 2 - LLM output]', llm_output, "\n")
@@ -138,11 +271,15 @@ class BotStrategy(BotBase):
                 self.add_profits(last_offer)
                 print('[DEBUG Bot_strategyy.respond_to_offer 3 - Evaluation of bot offer]')
                 evaluation = last_offer.evaluate(self.constraint_bot, self.constraint_user)
+                self.record_candidate(label, len(llm_offers) + 1, variant,
+                                      evaluation == ACCEPT)
                 if evaluation == ACCEPT:
                     break # Exit if the offer is complete and acceptable
             else:
                 # If the offer is not complete, set profits to 0 and continue
                 last_offer.profit_bot = last_offer.profit_user = 0
+                self.record_candidate(label, len(llm_offers) + 1, variant,
+                                      False)
             # Append the offer to the list and continue generating
             llm_offers.append([last_offer.profit_bot, llm_output, last_offer])
 
@@ -156,6 +293,16 @@ class BotStrategy(BotBase):
         self.send_response(llm_output,last_offer)
 
     async def respond_to_non_offer(self, evaluation: str):
+        if evaluation == INVALID_OFFER and self.config.get('llm_fast_invalid'):
+            llm_output = fast_reply(self.role, INVALID_OFFER)
+            if llm_output is not None:
+                self.send_response(llm_output, None)
+                return
+
+        if evaluation == NOT_OFFER and \
+                self.config.get('llm_counteroffer_engine') and \
+                await self.phrase_counteroffer(evaluation):
+            return
 
         content1 = self.get_respond_prompt(evaluation)
 
@@ -164,11 +311,17 @@ class BotStrategy(BotBase):
         except:
             content2 = content1
 
+        label = evaluation
+        plan = self.candidate_plan(label)
+        contents = {1: content1, 2: content2}
+
         llm_offers = []
         last_offer = llm_output = None
-        while len(llm_offers) < 3:  
+        while len(llm_offers) < len(plan):
+            variant = plan[len(llm_offers)]
             response = await self.get_llm_response(
-                content1 if len(llm_offers) < 2 else content2)
+                contents[variant],
+                cacheable=variant == 1 and self.cacheable(evaluation))
         
             print('\n[DEBUG Bot_strategy.respond_to_non_offer 1 - Bot internal message]', response['message'], "\n")
             llm_output = self.extract_content(response)
@@ -179,9 +332,13 @@ class BotStrategy(BotBase):
                 self.add_profits(last_offer)
                 print('[DEBUG Bot_strategyy.respond_to_non_offer 3 - Evaluation of bot offer]')
                 evaluation = last_offer.evaluate(self.constraint_bot, self.constraint_user)
+                self.record_candidate(label, len(llm_offers) + 1, variant,
+                                      evaluation == ACCEPT)
                 if evaluation == ACCEPT:
                     break
             else:
+                self.record_candidate(label, len(llm_offers) + 1, variant,
+                                      False)
                 last_offer.profit_bot = last_offer.profit_user = 0
                 llm_offers.append([last_offer.profit_bot, llm_output, last_offer])
                 print('[DEBUG Bot_strategyy.respond_to_non_offer 3 - Evaluation of bot offer]')
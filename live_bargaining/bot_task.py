@@ -1,8 +1,10 @@
 import asyncio
 import json
-from typing import Any, Callable, Dict
+import time
+from typing import Any, Callable, Dict, Optional
 
-from otree.channels import utils as channel_utils
+from .fair_queue import NoHostAvailable
+from .outbox import OUTBOX
 
 
 class BotTask:
@@ -10,13 +12,18 @@ class BotTask:
         self.get_session = None
         self.config = None
         self.add_debug_log = None
+        self.begin_work = None
+        self.flush_work = None
+        self.drain_writes = None
         self.store_send_data = None
+        self.summarize = None
+        self.degraded_turn = None
         raise RuntimeError
 
     @staticmethod
     def _unlock_interface(group_name: str):
-        asyncio.create_task(channel_utils.group_send(
-            group=group_name, data={'unblock': True}))
+        # Sent now, after anything of the turn still waiting in the outbox
+        OUTBOX.add(group_name, {'unblock': True})
 
     @classmethod
     def ensure_exception_handler(cls):
@@ -44,38 +51,64 @@ class BotTask:
         except Exception as e:
             print(f"\nError in exception_handler\n{name}\n{e}\n")
 
-    @staticmethod
-    def callback_handler(task: asyncio.Task):
-        from live_bargaining.session_patch import Queues
+    def time_left(self) -> Optional[float]:
+        """ Seconds until the Bargain page times out, None if unknown """
+        if self.config.get('deadline') is None:
+            return None
+        return self.config['deadline'] - time.time()
 
-        # Release the LLM host
-        async def release():
-            await Queues.release(
-                data['session_code'], data['round_number'], data['llm_host'])
+    async def until_deadline(self, coro: Callable):
+        # Cancels any LLM call in progress once the round is over, the host
+        # is released by the call itself
+        self.begin_work()
+        try:
+            await asyncio.wait_for(coro(), self.time_left())
+        except asyncio.TimeoutError:
+            self.add_debug_log(
+                f"Round ended during the turn of: {self.config['idx']}")
+        finally:
+            await self.drain_writes()
+            self.flush_work()
+            OUTBOX.end_turn(self.config['group_name'])
 
-        data = json.loads(task.get_name())
-        asyncio.create_task(release())
+    async def run_turn(self, coro: Callable):
+        try:
+            await self.until_deadline(coro)
+        except NoHostAvailable:
+            self.add_debug_log(
+                f"No LLM host available for: {self.config['idx']}")
+            if self.config.get('llm_degraded_mode'):
+                await self.until_deadline(self.degraded_turn)
+            else:
+                self.store_send_data(
+                    llm_output="I am sorry, could you repeat that?")
+                self._unlock_interface(self.config['group_name'])
 
-    async def start_task(self, coro: Callable):
-        from live_bargaining.session_patch import Queues
+        # Between turns, while the participant is typing
+        await self.run_background(self.summarize)
 
+    async def run_background(self, coro: Callable):
+        # Nice to have, skipped if there is no host for it
+        try:
+            await self.until_deadline(coro)
+        except NoHostAvailable:
+            pass
+
+    def _create_task(self, runner: Callable, coro: Callable):
         self.ensure_exception_handler()
-        llm_host = await Queues.acquire(
-            self.config['session_code'], self.config['round_number'])
-        self.config['llm_host'] = llm_host
+        time_left = self.time_left()
+        if time_left is not None and time_left <= 0:
+            return
 
-        if llm_host is None:
-            self.add_debug_log(
-                f"No LLM host available for: {self.config['idx']}")
-            self.store_send_data(
-                llm_output="I am sorry, could you repeat that?")
-            self._unlock_interface(self.config['group_name'])
-        else:
-            # Needed by the exception handler and callback handler
-            data = {'llm_host': llm_host,
-                    'group_name': self.config['group_name'],
-                    'session_code': self.config['session_code'],
-                    'round_number': self.config['round_number']}
-            task = asyncio.create_task(coro())
-            task.set_name(json.dumps(data))
-            task.add_done_callback(self.callback_handler)
+        # Needed by the exception handler
+        data = {'group_name': self.config['group_name'],
+                'session_code': self.config['session_code'],
+                'round_number': self.config['round_number']}
+        task = asyncio.create_task(runner(coro))
+        task.set_name(json.dumps(data))
+
+    async def start_task(self, coro: Callable):
+        self._create_task(self.run_turn, coro)
+
+    async def start_background(self, coro: Callable):
+        self._create_task(self.run_background, coro)
@@ -0,0 +1,116 @@
+import math
+import random
+from typing import Dict, List, Tuple
+
+from otree.api import *
+from otree.database import db
+from sqlalchemy import Integer, cast, func
+
+from .constants import Config
+
+MAX_CANDIDATES = 3
+# Prompt variant per candidate before there is enough history
+DEFAULT_PLAN = [1, 1, 2]
+
+Key = Tuple[str, str, str]
+
+
+class CandidateStats:
+    def __init__(self):
+        # Per candidate position: turns that got that far, and accepted there
+        self.reached = [0] * MAX_CANDIDATES
+        self.accepted = [0] * MAX_CANDIDATES
+        # Per prompt variant: candidates generated, and accepted
+        self.variant_tries = {1: 0, 2: 0}
+        self.variant_accepted = {1: 0, 2: 0}
+
+    def add(self, position: int, variant: int, accepted: int, tries: int = 1):
+        """ A candidate, or tries of them of which accepted were accepted """
+        self.reached[position - 1] += tries
+        self.accepted[position - 1] += accepted
+        self.variant_tries[variant] += tries
+        self.variant_accepted[variant] += accepted
+
+    def rate(self, tries: int, accepted: int) -> float:
+        return accepted / tries if tries else 0.0
+
+    @staticmethod
+    def upper_rate(tries: int, accepted: int) -> float:
+        """ The rate is very likely below this (adjusted Wald, 95%) """
+        rate = (accepted + 2) / (tries + 4)
+        return rate + 2 * math.sqrt(rate * (1 - rate) / (tries + 4))
+
+    def plan(self, config: Config, draw: float) -> List[int]:
+        """ Prompt variant per candidate to generate
+
+        The best variant once both have enough history. Candidates stop at
+        the first position that is very likely accepted less often than
+        llm_candidates_min_rate, later positions can only be reached through
+        it. With chance
+        llm_candidates_explore (draw below it) all positions are tried and
+        the last one with the other variant, so their history stays up to
+        date and a cut position can come back.
+        """
+        min_samples = config['llm_candidates_min_samples']
+        min_rate = config['llm_candidates_min_rate']
+
+        plan = list(DEFAULT_PLAN)
+        if min(self.variant_tries.values()) >= min_samples:
+            best = max((1, 2), key=lambda v: self.rate(
+                self.variant_tries[v], self.variant_accepted[v]))
+            plan = [best] * MAX_CANDIDATES
+
+        if draw < config.get('llm_candidates_explore', 0):
+            plan[-1] = 3 - plan[0]
+            return plan
+
+        for position in range(2, MAX_CANDIDATES + 1):
+            reached = self.reached[position - 1]
+            accepted = self.accepted[position - 1]
+            if reached >= min_samples and \
+                    self.upper_rate(reached, accepted) < min_rate:
+                return plan[:position - 1]
+        return plan
+
+
+# Learned from all sessions, loaded from CandidateHistory on first use
+CANDIDATE_STATS: Dict[Key, CandidateStats] = {}
+
+
+class CandidateHistory(ExtraModel):
+    """ One row per bot candidate reply """
+    label = models.StringField()
+    model = models.StringField()
+    role = models.StringField()
+    position = models.IntegerField()
+    variant = models.IntegerField()
+    accepted = models.BooleanField()
+
+    @classmethod
+    def stats(cls, key: Key) -> CandidateStats:
+        if not CANDIDATE_STATS:
+            columns = (cls.label, cls.model, cls.role, cls.position,
+                       cls.variant)
+            rows = db.query(*columns, func.count(cls.id),
+                            func.sum(cast(cls.accepted, Integer))) \
+                .group_by(*columns)
+            for label, model, role, position, variant, tries, accepted \
+                    in rows:
+                CANDIDATE_STATS.setdefault(
+                    (label, model, role), CandidateStats()).add(
+                    position, variant, accepted or 0, tries)
+        return CANDIDATE_STATS.setdefault(key, CandidateStats())
+
+    @classmethod
+    def record(cls, key: Key, position: int, variant: int, accepted: bool) \
+            -> 'CandidateHistory':
+        """ Counts the candidate, the returned row still has to be added """
+        cls.stats(key).add(position, variant, accepted)
+        label, model, role = key
+        return cls(label=label, model=model, role=role, position=position,
+                   variant=variant, accepted=accepted)
+
+    @classmethod
+    def plan(cls, key: Key, config: Config) -> List[int]:
+        return cls.stats(key).plan(config, random.random())
+
@@ -0,0 +1,45 @@
+from typing import Any, Dict, List
+
+from .constants import Config
+
+
+def estimate_tokens(text: str) -> int:
+    # Llama tokenizers average about four characters per token in English
+    return len(text) // 4 + 1
+
+
+class ConversationWindow:
+    """ The conversation history as put in the follow up prompts
+
+    A running summary (kept in bot_vars) covers the interactions before
+    'summarized', the rest is verbatim. Summaries are made between turns and
+    cover all but the last llm_context_turns interactions. If the summary
+    lags behind, the oldest verbatim interactions are dropped as soon as the
+    history exceeds llm_context_tokens.
+    """
+    def __init__(self, interactions: List[Dict[str, str]], config: Config):
+        bot_vars = config['bot_vars']
+        self.interactions = interactions
+        self.summary: str = bot_vars.get('summary', '')
+        self.summarized: int = bot_vars.get('summarized', 0)
+        self.turns: int = config.get('llm_context_turns', 8)
+        self.budget: int = config.get('llm_context_tokens', 2000)
+
+    @property
+    def to_summarize(self) -> List[Dict[str, str]]:
+        """ Interactions that fell out of the window but are not summarized """
+        return self.interactions[self.summarized:-self.turns or None] \
+            if len(self.interactions) > self.turns else []
+
+    def render(self) -> str:
+        head = [{'role': 'summary', 'content': self.summary}] \
+            if self.summary else []
+        verbatim = list(self.interactions[self.summarized:])
+        while len(verbatim) > 1 and \
+                estimate_tokens(str(head + verbatim)) > self.budget:
+            verbatim.pop(0)
+        return str(head + verbatim)
+
+    def summarized_vars(self, summary: str) -> Dict[str, Any]:
+        return {'summary': summary,
+                'summarized': self.summarized + len(self.to_summarize)}
@@ -0,0 +1,83 @@
+import asyncio
+import queue
+import threading
+from typing import Any, Callable, Optional
+
+from otree.database import engine
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from .constants import Config
+
+Operation = Callable[[Session], Any]
+
+
+class DBWriter:
+    """ A thread with its own database session for inserts of the bots
+
+    Bot tasks submit operations and await them, the event loop does not wait
+    for the database. At most 'size' operations are queued, more submits wait
+    for a free place. The shared oTree session stays on the event loop.
+    """
+    def __init__(self, size: int = 100):
+        self.size = size
+        self.queue: queue.Queue = queue.Queue()
+        self.slots: Optional[asyncio.Semaphore] = None
+        self.thread: Optional[threading.Thread] = None
+        self.done = 0
+        self.failed = 0
+
+    @staticmethod
+    def enabled(config: Config) -> bool:
+        # An in-memory SQLite database (devserver) exists in one connection
+        return bool(config.get('db_writer_thread')) and \
+            engine.url.get_backend_name() != 'sqlite'
+
+    def start(self):
+        if self.thread is None:
+            self.slots = asyncio.Semaphore(self.size)
+            self.thread = threading.Thread(target=self.run, daemon=True,
+                                           name='db_writer')
+            self.thread.start()
+
+    async def submit(self, operation: Operation) -> Any:
+        self.start()
+        async with self.slots:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self.queue.put((operation, future, loop))
+            return await future
+
+    def run(self):
+        # oTree's engine shares one connection between all sessions, the
+        # writer has a connection of its own
+        session = sessionmaker(bind=create_engine(engine.url, pool_size=1))()
+        while True:
+            operation, future, loop = self.queue.get()
+            try:
+                result = operation(session)
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                self.failed += 1
+                loop.call_soon_threadsafe(self.resolve, future, None, e)
+                continue
+            self.done += 1
+            loop.call_soon_threadsafe(self.resolve, future, result, None)
+
+    @staticmethod
+    def resolve(future: asyncio.Future, result: Any,
+                error: Optional[Exception]):
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def stats(self) -> str:
+        return f"DB writer: {self.done} done, {self.failed} failed, " \
+               f"{self.queue.qsize()} queued"
+
+
+DB_WRITER = DBWriter()
@@ -0,0 +1,56 @@
+from collections import deque
+from typing import Deque, Dict, List, Tuple
+
+from otree.api import *
+from otree.database import db
+from sqlalchemy import Index
+
+# Lines per session and round kept in memory for the admin report
+RING_SIZE = 500
+
+Key = Tuple[str, int]
+
+# Per process, filled from DebugLog after a restart
+RINGS: Dict[Key, Deque[str]] = {}
+# Lines not yet in the database, per session and round
+PENDING: Dict[Key, List[str]] = {}
+
+
+class DebugLog(ExtraModel):
+    """ One row per debug line, round 0 is session wide """
+    session_code = models.StringField()
+    round_number = models.IntegerField()
+    message = models.LongStringField()
+
+    __table_args__ = (Index('debuglog_key', 'session_code', 'round_number'),)
+
+    @classmethod
+    def ring(cls, session_code: str, round_number: int) -> Deque[str]:
+        key = (session_code, round_number)
+        if key not in RINGS:
+            # ExtraModel.filter() needs a model instance, query directly
+            rows = db.query(cls.message).filter_by(
+                session_code=session_code, round_number=round_number) \
+                .order_by(cls.id.desc()).limit(RING_SIZE).all()
+            RINGS[key] = deque((message for message, in reversed(rows)),
+                               maxlen=RING_SIZE)
+        return RINGS[key]
+
+    @classmethod
+    def add(cls, session_code: str, round_number: int, message: str):
+        cls.ring(session_code, round_number).append(message)
+        PENDING.setdefault((session_code, round_number), []).append(message)
+
+    @classmethod
+    def flush(cls, session_code: str, round_number: int):
+        """ Inserts the pending lines of a session and round in the database
+        session in one statement, no commit """
+        pending = PENDING.pop((session_code, round_number), None)
+        if pending:
+            db._db.bulk_insert_mappings(cls, [
+                dict(session_code=session_code, round_number=round_number,
+                     message=message) for message in pending])
+
+    @classmethod
+    def lines(cls, session_code: str, round_number: int) -> List[str]:
+        return list(cls.ring(session_code, round_number))
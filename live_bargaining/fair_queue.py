@@ -0,0 +1,220 @@
+import asyncio
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+from .host_health import HostHealth
+
+# Priority classes, lower is served first
+PRIORITY_INTERPRET = 0
+PRIORITY_GENERATE = 1
+# Warm-up and other background calls
+PRIORITY_WARMUP = 2
+
+
+class NoHostAvailable(Exception):
+    pass
+
+
+class Waiter:
+    """ An LLM call waiting for a host """
+    def __init__(self, participant: str, future: asyncio.Future,
+                 priority: int, deadline: Optional[float],
+                 preferred: Optional[str] = None):
+        self.participant = participant
+        self.future = future
+        self.priority = priority
+        self.deadline = deadline
+        self.preferred = preferred
+        self.enqueued = time.time()
+
+    def level(self, now: float, aging: float, boost_window: float) -> int:
+        """ Priority class, raised one level per aging period waited and
+        one more when the round of the participant is about to end """
+        level = self.priority
+        if aging:
+            level = max(PRIORITY_INTERPRET,
+                        level - int((now - self.enqueued) / aging))
+        if self.deadline is not None and self.deadline - now < boost_window:
+            level -= 1
+        return level
+
+
+class Flow:
+    """ All waiters of one session, served in proportion to its weight
+
+    Weighted fair queuing: every grant advances the virtual time of the flow
+    by 1 / weight, the backlogged flow with the lowest virtual time goes next.
+    Priority comes before fairness: a higher priority waiter of any session
+    is served first. Within a session, waiters of the same priority are
+    either FIFO or round robin per participant.
+    """
+    def __init__(self, session_code: str, llm_hosts: List[str]):
+        self.session_code = session_code
+        self.llm_hosts = llm_hosts
+        self.weight = 1.0
+        self.per_participant = False
+        self.aging = 10.0
+        self.boost_window = 30.0
+        self.virtual_time = 0.0
+        self.queues: Dict[str, Deque[Waiter]] = {}
+        self.turns: Deque[str] = deque()
+
+        # Statistics
+        self.served = 0
+        self.timed_out = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @property
+    def depth(self) -> int:
+        return sum(len(queue) for queue in self.queues.values())
+
+    def push(self, waiter: Waiter):
+        key = waiter.participant if self.per_participant else ''
+        if key not in self.queues:
+            self.queues[key] = deque()
+            self.turns.append(key)
+        self.queues[key].append(waiter)
+
+    def peek(self, now: float) -> Optional[Waiter]:
+        """ Highest priority waiter, ties go round robin then FIFO
+
+        Waiters that timed out or were cancelled but are still queued, are
+        dropped here, so no slot is handed to them.
+        """
+        for waiter in [waiter for queue in self.queues.values()
+                       for waiter in queue if waiter.future.done()]:
+            self.discard(waiter)
+        best = best_key = None
+        for position, key in enumerate(self.turns):
+            for waiter in self.queues[key]:
+                sort_key = (self.level(waiter, now), position, waiter.enqueued)
+                if best_key is None or sort_key < best_key:
+                    best, best_key = waiter, sort_key
+        return best
+
+    def level(self, waiter: Waiter, now: float) -> int:
+        return waiter.level(now, self.aging, self.boost_window)
+
+    def pop(self, waiter: Waiter):
+        self.discard(waiter)
+        # Round robin: the served participant goes to the back
+        key = waiter.participant if self.per_participant else ''
+        if key in self.queues:
+            self.turns.remove(key)
+            self.turns.append(key)
+
+    def discard(self, waiter: Waiter):
+        for key, queue in list(self.queues.items()):
+            if waiter in queue:
+                queue.remove(waiter)
+                if not queue:
+                    del self.queues[key]
+                    self.turns.remove(key)
+                return
+
+    def record_grant(self, waiter: Waiter):
+        wait = time.time() - waiter.enqueued
+        self.served += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+
+    def stats(self) -> str:
+        avg_wait = self.total_wait / self.served if self.served else 0.0
+        return f"LLM queue {self.session_code} weight {self.weight:g}: " \
+               f"depth {self.depth}, served {self.served}, " \
+               f"timed out {self.timed_out}, " \
+               f"wait avg {avg_wait:.1f}s max {self.max_wait:.1f}s"
+
+
+class FairQueue:
+    """ Free host slots shared by all sessions, granted to flows fairly """
+    def __init__(self):
+        self.free_slots: Dict[str, int] = {}
+        self.flows: Dict[str, Flow] = {}
+        self.virtual_clock = 0.0
+
+    def add_flow(self, session_code: str, llm_hosts: List[str],
+                 slots: int = 1) -> Flow:
+        if session_code not in self.flows:
+            self.flows[session_code] = Flow(session_code, llm_hosts)
+        for llm_host in llm_hosts:
+            self.free_slots.setdefault(llm_host, slots)
+        return self.flows[session_code]
+
+    def free_host(self, flow: Flow, preferred: str = None,
+                  exclude: str = None) -> Optional[str]:
+        # The preferred host first, any other if it is busy
+        llm_hosts = flow.llm_hosts
+        if preferred in llm_hosts:
+            llm_hosts = [preferred] + llm_hosts
+        for llm_host in llm_hosts:
+            if llm_host == exclude:
+                continue
+            if self.free_slots.get(llm_host, 0) > 0 and \
+                    HostHealth.get(llm_host).allow_request():
+                self.free_slots[llm_host] -= 1
+                return llm_host
+        return None
+
+    def dispatch(self):
+        """ Hand free slots to waiters, highest priority then lowest
+        virtual time first """
+        while True:
+            now = time.time()
+            heads = [(flow.peek(now), flow) for flow in self.flows.values()]
+            heads = sorted(((waiter, flow) for waiter, flow in heads
+                            if waiter is not None),
+                           key=lambda h: (h[1].level(h[0], now),
+                                          h[1].virtual_time))
+            for waiter, flow in heads:
+                llm_host = self.free_host(flow, waiter.preferred)
+                if llm_host is None:
+                    continue
+                flow.pop(waiter)
+                flow.record_grant(waiter)
+                flow.virtual_time += 1 / flow.weight
+                self.virtual_clock = flow.virtual_time
+                waiter.future.set_result(llm_host)
+                break
+            else:
+                return
+
+    async def acquire(self, session_code: str, participant: str,
+                      timeout: float, priority: int = PRIORITY_GENERATE,
+                      deadline: float = None,
+                      preferred: str = None) -> Optional[str]:
+        flow = self.flows[session_code]
+        if flow.peek(time.time()) is None:
+            # An idle flow does not bank credit while it was not waiting
+            flow.virtual_time = max(flow.virtual_time, self.virtual_clock)
+
+        waiter = Waiter(participant,
+                        asyncio.get_running_loop().create_future(),
+                        priority, deadline, preferred)
+        flow.push(waiter)
+        self.dispatch()
+        try:
+            return await asyncio.wait_for(waiter.future, timeout)
+        except asyncio.TimeoutError:
+            flow.discard(waiter)
+            flow.timed_out += 1
+            return None
+        except asyncio.CancelledError:
+            flow.discard(waiter)
+            if waiter.future.done() and not waiter.future.cancelled():
+                self.release(waiter.future.result())
+            raise
+
+    def try_acquire(self, session_code: str,
+                    exclude: str = None) -> Optional[str]:
+        flow = self.flows.get(session_code)
+        if flow is None:
+            return None
+        return self.free_host(flow, exclude=exclude)
+
+    def release(self, llm_host: str):
+        HostHealth.get(llm_host).release_lease()
+        self.free_slots[llm_host] = self.free_slots.get(llm_host, 0) + 1
+        self.dispatch()
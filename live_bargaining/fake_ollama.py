@@ -0,0 +1,264 @@
+""" Ollama-compatible stand-in for load tests and benchmarks without GPUs
+
+Serves /, /api/tags, /api/version and /api/chat (streaming and format) with
+rule-based replies: the reader models read offers and constraints with the
+regex parser, other models propose the optimal offer from the prompt. Each
+port is a host with its own latency and error profile:
+
+    python -m live_bargaining.fake_ollama 11434:surf 11435:flaky --seed 1
+
+and start oTree with FAKE_OLLAMA=11434,11435 to use them. A script file
+({"<model>": ["reply", ...]}) replaces the rules for the models it lists,
+replies are used in turn.
+"""
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from .conversation import estimate_tokens
+from .offer import parse_offer
+from .prompts import PROMPTS
+
+
+class Profile(NamedTuple):
+    # Median seconds of a call, and the spread of the lognormal around it
+    latency: float
+    sigma: float
+    # Chance of an HTTP 500, and of a call that never answers in time
+    error_rate: float
+    stall_rate: float
+    # Seconds per generated token when streaming
+    token_delay: float
+
+
+PROFILES: Dict[str, Profile] = {
+    'instant': Profile(0.0, 0.0, 0.0, 0.0, 0.0),
+    'fast': Profile(0.2, 0.2, 0.0, 0.0, 0.005),
+    'surf': Profile(2.0, 0.5, 0.01, 0.0, 0.03),
+    'slow': Profile(8.0, 0.5, 0.02, 0.01, 0.08),
+    'flaky': Profile(2.0, 0.8, 0.2, 0.05, 0.03),
+}
+
+MODELS = ['llama3:latest', 'reader:latest', 'constrain_reader:latest']
+
+PATTERN_OPTIMAL = re.compile(PROMPTS['offer_string'].replace(
+    '%s', r'([\d.]+)').replace('€', '€?'), re.IGNORECASE)
+PATTERN_NUMBER = re.compile(r'\d+(?:[.,]\d+)?')
+
+
+def reader_reply(content: str) -> str:
+    message = content.split(PROMPTS['understanding_offer'], 1)[-1]
+    offer = parse_offer(message, 0)
+    price = f"{offer.price:.2f}€" if offer.price is not None else ''
+    quality = offer.quality if offer.quality is not None else ''
+    return f"[{price}, {quality}]" if price or quality else '[,]'
+
+
+def constraint_reply(content: str) -> str:
+    message = content.split(PROMPTS['constraints'], 1)[-1]
+    match = PATTERN_NUMBER.search(message)
+    return f"[{match.group().replace(',', '.')}]" if match else '[]'
+
+
+def negotiator_reply(content: str) -> str:
+    match = PATTERN_OPTIMAL.search(content)
+    if match:
+        price, quality = match.groups()
+        return f'"I propose a Wholesale Price of €{float(price):.2f} for ' \
+               f'{round(float(quality))} units. What do you think?"'
+    if content.startswith(PROMPTS['accept_from_chat']):
+        return '"That works for me. Please click the CONFIRM button below ' \
+               'the SEND button to seal the deal."'
+    if content.startswith(PROMPTS['accept_from_interface']):
+        return '"That works for me, thank you. We have a deal."'
+    return '"Could you propose a Wholesale Price and a Quantity?"'
+
+
+class Host:
+    """ State of one stand-in host """
+    def __init__(self, profile: Profile, seed: int,
+                 script: Dict[str, List[str]]):
+        self.profile = profile
+        self.random = random.Random(seed)
+        self.script = script
+        self.turns: Dict[str, int] = {}
+        # Last prompt per model, to report prefix reuse like Ollama does
+        self.prompts: Dict[str, str] = {}
+        self.lock = threading.Lock()
+
+    def draw(self) -> Tuple[str, float]:
+        """ Outcome ('ok', 'error' or 'stall') and seconds of latency """
+        with self.lock:
+            outcome = self.random.random()
+            latency = self.random.lognormvariate(
+                math.log(self.profile.latency), self.profile.sigma) \
+                if self.profile.latency else 0.0
+        if outcome < self.profile.error_rate:
+            return 'error', latency
+        if outcome < self.profile.error_rate + self.profile.stall_rate:
+            return 'stall', latency
+        return 'ok', latency
+
+    def reply(self, model: str, messages: List[Dict[str, str]]) -> str:
+        name = model.split(':')[0]
+        content = messages[-1]['content'] if messages else ''
+        if name in self.script:
+            with self.lock:
+                turn = self.turns.get(name, 0)
+                self.turns[name] = turn + 1
+            replies = self.script[name]
+            return replies[turn % len(replies)]
+        if name == 'reader':
+            return reader_reply(content)
+        if name == 'constrain_reader':
+            return constraint_reply(content)
+        return negotiator_reply(content)
+
+    def prompt_eval_count(self, model: str, prompt: str) -> int:
+        with self.lock:
+            last = self.prompts.get(model, '')
+            self.prompts[model] = prompt
+        common = 0
+        for a, b in zip(last, prompt):
+            if a != b:
+                break
+            common += 1
+        return estimate_tokens(prompt[common:])
+
+
+def chat_response(model: str, content: str, done: bool, **extra) \
+        -> Dict[str, Any]:
+    return {'model': model,
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'message': {'role': 'assistant', 'content': content},
+            'done': done, **extra}
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    host: Host = None
+
+    def log_message(self, format: str, *args):
+        pass
+
+    def send_json(self, status: int, data: Dict[str, Any]):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_chunk(self, data: Dict[str, Any]):
+        body = json.dumps(data).encode() + b'\n'
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(body), body))
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path == '/':
+            body = b'Ollama is running'
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif self.path == '/api/tags':
+            self.send_json(200, {'models': [
+                {'name': model, 'model': model, 'size': 0}
+                for model in MODELS]})
+        elif self.path == '/api/version':
+            self.send_json(200, {'version': '0.0.0-fake'})
+        else:
+            self.send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+        if self.path != '/api/chat':
+            self.send_json(404, {'error': 'not found'})
+            return
+
+        model = request.get('model', '')
+        messages = request.get('messages') or []
+        outcome, latency = self.host.draw()
+        if outcome == 'stall':
+            # Longer than any sensible client timeout
+            time.sleep(max(latency, 1) * 100)
+        time.sleep(latency)
+        if outcome == 'error':
+            self.send_json(500, {'error': 'fake ollama: scripted failure'})
+            return
+
+        content = self.host.reply(model, messages)
+        if request.get('format'):
+            content = json.dumps({'content': content})
+        if (request.get('options') or {}).get('num_predict') == 1:
+            content = content[:1]
+
+        prompt = ''.join(m.get('content', '') for m in messages)
+        eval_count = estimate_tokens(content)
+        stats = {'done_reason': 'stop',
+                 'total_duration': int(latency * 1e9),
+                 'load_duration': 0,
+                 'prompt_eval_count': self.host.prompt_eval_count(model, prompt),
+                 'prompt_eval_duration': int(latency * 0.2 * 1e9),
+                 'eval_count': eval_count,
+                 'eval_duration': int(latency * 0.8 * 1e9)}
+
+        if request.get('stream', True) is False:
+            self.send_json(200, chat_response(model, content, True, **stats))
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for word in re.findall(r'\S+\s*', content):
+            self.send_chunk(chat_response(model, word, False))
+            time.sleep(self.host.profile.token_delay)
+        self.send_chunk(chat_response(model, '', True, **stats))
+        self.wfile.write(b'0\r\n\r\n')
+
+
+def serve(port: int, profile: Profile, seed: int,
+          script: Optional[Dict[str, List[str]]] = None) -> ThreadingHTTPServer:
+    handler = type('Handler', (Handler,),
+                   {'host': Host(profile, seed, script or {})})
+    server = ThreadingHTTPServer(('localhost', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('hosts', nargs='+', metavar='PORT[:PROFILE]',
+                        help=f"profiles: {', '.join(PROFILES)} "
+                             f"(default surf)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--script', help='JSON file with replies per model')
+    args = parser.parse_args()
+
+    script = None
+    if args.script:
+        with open(args.script, 'r') as f:
+            script = json.load(f)
+
+    for host in args.hosts:
+        port, _, name = host.partition(':')
+        serve(int(port), PROFILES[name or 'surf'], args.seed + int(port),
+              script)
+        print(f"Fake Ollama on http://localhost:{port} ({name or 'surf'})")
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
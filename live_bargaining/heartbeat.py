@@ -0,0 +1,126 @@
+import time
+from typing import Any, Dict
+
+from otree.api import *
+from otree.channels.consumers import LiveConsumer
+from otree.database import db, session_scope
+from otree.middleware import lock2
+from sqlalchemy import Index, case
+
+# Pages whose pings are answered here, their live_method returns nothing
+PAGES = {'Bargain'}
+# Seconds between writes of the last ping of each participant
+FLUSH_INTERVAL = 30
+
+
+class LastPing(ExtraModel):
+    """ Time of the last ping per participant
+
+    Not in Participant._last_request_timestamp, oTree sets that on page
+    requests only and uses it for the admin monitor and arrival grouping.
+    """
+    participant_code = models.StringField()
+    timestamp = models.IntegerField()
+
+    __table_args__ = (
+        Index('lastping_code', 'participant_code', unique=True),)
+
+
+class Heartbeat:
+    """ Pings are answered without loading participant and player
+
+    The time of the last ping per participant is kept in memory and written
+    to LastPing every FLUSH_INTERVAL seconds, and when the participant leaves
+    the page.
+    """
+    last_seen: Dict[str, int] = {}
+    unsaved: Dict[str, int] = {}
+    last_flush = time.time()
+    pings = 0
+    flushes = 0
+
+    @classmethod
+    def is_ping(cls, page_name: str, data: Any) -> bool:
+        return page_name in PAGES and isinstance(data, dict) and \
+            data.get('type') == 'ping'
+
+    @classmethod
+    def record(cls, participant_code: str):
+        cls.pings += 1
+        cls.last_seen[participant_code] = \
+            cls.unsaved[participant_code] = int(time.time())
+
+    @classmethod
+    def due(cls) -> bool:
+        return bool(cls.unsaved) and \
+            time.time() - cls.last_flush >= FLUSH_INTERVAL
+
+    @classmethod
+    def flush(cls):
+        unsaved, cls.unsaved = cls.unsaved, {}
+        cls.last_flush = time.time()
+        cls.write(unsaved)
+
+    @classmethod
+    def leave(cls, participant_code: str):
+        cls.last_seen.pop(participant_code, None)
+        timestamp = cls.unsaved.pop(participant_code, None)
+        if timestamp is not None:
+            cls.write({participant_code: timestamp})
+
+    @classmethod
+    def write(cls, timestamps: Dict[str, int]):
+        """ One UPDATE of the known participants, one INSERT of the others """
+        if not timestamps:
+            return
+        stored = {code for code, in db.query(LastPing.participant_code)
+                  .filter(LastPing.participant_code.in_(list(timestamps)))}
+        if stored:
+            db.query(LastPing) \
+                .filter(LastPing.participant_code.in_(list(stored))) \
+                .update({LastPing.timestamp: case(
+                    {code: timestamps[code] for code in stored},
+                    value=LastPing.participant_code)},
+                    synchronize_session=False)
+        new = [dict(participant_code=code, timestamp=timestamp)
+               for code, timestamp in timestamps.items()
+               if code not in stored]
+        if new:
+            db._db.bulk_insert_mappings(LastPing, new)
+        cls.flushes += 1
+
+    @classmethod
+    def stats(cls) -> str:
+        return f"Heartbeat: {cls.pings} pings, {len(cls.last_seen)} " \
+               f"participants, {cls.flushes} flushes, " \
+               f"{len(cls.unsaved)} unsaved"
+
+
+def patch_heartbeat():
+    """ LiveConsumer.on_receive, pre_disconnect and cleaned_kwargs are oTree
+    internals, as in the otree version of requirements.txt. Without them the
+    pings keep going to Bargain.live_method. """
+    if not all(hasattr(LiveConsumer, name)
+               for name in ('on_receive', 'pre_disconnect')):
+        return
+    on_receive = LiveConsumer.on_receive
+    pre_disconnect = LiveConsumer.pre_disconnect
+
+    async def on_receive_ping(self, websocket, data):
+        if not Heartbeat.is_ping(self.cleaned_kwargs.get('page_name'), data):
+            return await on_receive(self, websocket, data)
+
+        Heartbeat.record(self.cleaned_kwargs['participant_code'])
+        if Heartbeat.due():
+            async with lock2:
+                with session_scope():
+                    Heartbeat.flush()
+
+    async def pre_disconnect_leave(self, **kwargs):
+        # Called by oTree within lock2 and a session_scope
+        if kwargs.get('page_name') in PAGES:
+            Heartbeat.leave(kwargs['participant_code'])
+        await pre_disconnect(self, **kwargs)
+
+    LiveConsumer.on_receive = on_receive_ping
+    LiveConsumer.pre_disconnect = pre_disconnect_leave
@@ -0,0 +1,102 @@
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+from .constants import Config
+
+# Shared by all sessions, a host is the same machine whatever session uses it
+HOST_HEALTH: Dict[str, 'HostHealth'] = {}
+
+
+class HostHealth:
+    """ Latency history and circuit breaker of a single LLM host """
+    WINDOW = 50
+    MIN_SAMPLES = 5
+
+    def __init__(self, llm_host: str):
+        self.llm_host = llm_host
+        self.latencies = deque(maxlen=self.WINDOW)
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.cooldown = 30.0
+        # A probe is leased, and then running once its call started
+        self.probing = False
+        self.probe_running = False
+
+    @classmethod
+    def get(cls, llm_host: str) -> 'HostHealth':
+        if llm_host not in HOST_HEALTH:
+            HOST_HEALTH[llm_host] = cls(llm_host)
+        return HOST_HEALTH[llm_host]
+
+    @property
+    def p95(self) -> Optional[float]:
+        """ None until enough calls have been measured """
+        if len(self.latencies) < self.MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * .95))]
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def allow_request(self) -> bool:
+        """ Closed: always. Open: a single probe once the cooldown passed """
+        if self.opened_at is None:
+            return True
+        if self.probing or time.time() < self.opened_at + self.cooldown:
+            return False
+        self.probing = True
+        return True
+
+    def start_call(self) -> bool:
+        """ True if this call is the probe """
+        if self.probing and not self.probe_running:
+            self.probe_running = True
+            return True
+        return False
+
+    def end_probe(self):
+        self.probing = False
+        self.probe_running = False
+
+    def release_lease(self):
+        """ A probe lease given back without a call, allow the next probe """
+        if self.probing and not self.probe_running:
+            self.end_probe()
+
+    def record_success(self, latency: float):
+        self.latencies.append(latency)
+        self.failures = 0
+        self.opened_at = None
+        self.end_probe()
+
+    def record_cancel(self, latency: Optional[float], probe: bool):
+        """ The call took at least latency, None if that says nothing
+        (a losing backup), the circuit stays as it is """
+        if latency is not None:
+            self.latencies.append(latency)
+        if probe:
+            self.end_probe()
+
+    def record_failure(self, config: Config) -> bool:
+        """ Returns True if this failure opened the circuit """
+        self.failures += 1
+        self.cooldown = config.get('llm_breaker_cooldown', self.cooldown)
+        if self.probing:
+            # The probe failed, stay open for another cooldown
+            self.end_probe()
+            self.opened_at = time.time()
+            return False
+        if self.opened_at is None and \
+                self.failures >= config.get('llm_breaker_failures', 3):
+            self.opened_at = time.time()
+            return True
+        return False
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {'llm_host': self.llm_host,
+                'p95': self.p95,
+                'failures': self.failures,
+                'open': self.is_open}
@@ -2,6 +2,7 @@ import random
 from typing import List, Tuple
 
 from .constants import C
+from .debug_log import DebugLog
 from .session_counter import SessionCounter
 
 
@@ -247,5 +248,6 @@ class Matching:
 
                 assert len(group) == 2
                 assert sorted(C.ROLES) == sorted([player_1.role, player_2.role])
-        self.session.debug_log[self.round_number].append(
-            'GROUPS: ' + '   '.join(debug_log))
\ No newline at end of file
+        DebugLog.add(self.session.code, self.round_number,
+                     'GROUPS: ' + '   '.join(debug_log))
+        DebugLog.flush(self.session.code, self.round_number)
\ No newline at end of file
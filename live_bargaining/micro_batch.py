@@ -0,0 +1,100 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+Request = Dict[str, Any]
+Flush = Callable[[List[Request]], Awaitable[List[Any]]]
+
+
+class Batch:
+    def __init__(self, flush: Flush):
+        # The flush of the first caller sends the whole batch
+        self.flush = flush
+        self.items: List[Tuple[Request, asyncio.Future]] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+# Shared by all bots, per (session, round, model)
+PENDING: Dict[Tuple[str, int, str], Batch] = {}
+
+
+class MicroBatch:
+    """ Reader calls arriving within a few milliseconds share one host lease
+
+    The requests of a batch are sent in parallel to the same host over one
+    connection, the results go back to each waiting bot.
+    """
+    batches = 0
+    requests = 0
+    abandoned = 0
+
+    @classmethod
+    async def run(cls, key: Tuple[str, int, str], request: Request,
+                  flush: Flush, window: float, size: int) -> Any:
+        loop = asyncio.get_event_loop()
+        batch = PENDING.get(key)
+        if batch is None:
+            batch = PENDING[key] = Batch(flush)
+            batch.timer = loop.call_later(window, cls.start, key, batch)
+
+        future = loop.create_future()
+        batch.items.append((request, future))
+        if len(batch.items) >= size:
+            cls.start(key, batch)
+        return await future
+
+    @classmethod
+    def start(cls, key: Tuple[str, int, str], batch: Batch):
+        if PENDING.get(key) is not batch:
+            return
+        del PENDING[key]
+        batch.timer.cancel()
+        asyncio.ensure_future(cls.send(batch))
+
+    @classmethod
+    async def send(cls, batch: Batch):
+        # Bots that stopped waiting are left out
+        items = [(request, future) for request, future in batch.items
+                 if not future.done()]
+        if not items:
+            return
+        cls.batches += 1
+        cls.requests += len(items)
+
+        # Once no bot waits for a result, the lease is given back
+        task = asyncio.ensure_future(
+            batch.flush([request for request, _ in items]))
+
+        def abandon(_):
+            if not task.done() and all(future.done() for _, future in items):
+                cls.abandoned += 1
+                task.cancel()
+
+        for _, future in items:
+            future.add_done_callback(abandon)
+        try:
+            results = await task
+        except asyncio.CancelledError:
+            if all(future.done() for _, future in items):
+                return
+            for _, future in items:
+                future.cancel()
+            raise
+        except Exception as e:
+            results = [e] * len(items)
+
+        for (_, future), result in zip(items, results):
+            if future.done():
+                continue
+            if isinstance(result, asyncio.CancelledError):
+                future.cancel()
+            elif isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    @classmethod
+    def stats(cls) -> str:
+        size = cls.requests / cls.batches if cls.batches else 0
+        return f"LLM micro batches: {cls.batches} batches, " \
+               f"{cls.requests} requests, {size:.1f} per batch, " \
+               f"{cls.abandoned} abandoned"
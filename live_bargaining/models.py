@@ -1,20 +1,21 @@
-import json
 import random
 from functools import cached_property
 from typing import Any, Dict, List, Tuple, Union
 
 from otree.api import *
 from otree.database import db, wrap_column, AUTO_SUBMIT_DEFAULTS, OTreeColumn
-from sqlalchemy.sql import sqltypes as st
+from sqlalchemy import func
 
 from .bot_negotiation import NegotiationBot
+from .debug_log import DebugLog
 from .constants import C
 from .matching import Matching
 from .offer import Offer
+from .serializer import JsonType, dumps, loads
 from .session_counter import SessionCounter
 from .utils import now_datetime
 
-AUTO_SUBMIT_DEFAULTS[st.JSON] = None
+AUTO_SUBMIT_DEFAULTS[JsonType] = None
 
 def is_class_active(session_config_details, _class) -> bool:
     return session_config_details.get(_class, False)
@@ -67,7 +68,7 @@ def initialize_negotiation_classes(config):
 
 # Do not user .append / += [] (list), .update (dict) or form_fields!
 def JsonField(**kwargs) -> OTreeColumn:
-    return wrap_column(st.JSON, **kwargs)
+    return wrap_column(JsonType, **kwargs)
 
 
 class Subsession(BaseSubsession, Matching):
@@ -75,8 +76,6 @@ class Subsession(BaseSubsession, Matching):
     available_classes = JsonField(initial={})
 
     def initialize_subsession(self):
-        BotProfits.create_new(self)
-
         config = self.session.config
         preference_role = config['preference_role']
         if not preference_role:
@@ -117,18 +116,33 @@ def creating_session(sub_session: Subsession):
     sub_session.initialize_subsession()
 
 def vars_for_admin_report(sub_session: Subsession) -> Dict[str, Any]:
+    from live_bargaining.session_patch import Queues
+    from live_bargaining.single_flight import SingleFlight
+    from live_bargaining.micro_batch import MicroBatch
+    from live_bargaining.db_writer import DB_WRITER
+    from live_bargaining.outbox import OUTBOX
+    from live_bargaining.heartbeat import Heartbeat
+    from live_bargaining.response_cache import RESPONSE_CACHE
+    from live_bargaining.prefix_cache import PREFIX_CACHE
+
     actual_round_number = sub_session.get_players()[0].participant._round_number
     actual_round_number = actual_round_number or 1
 
     # Change to the sub_session of the current round
     sub_session = sub_session.session.get_subsessions()[actual_round_number - 1]
-    # sub_session.session.debug_log[0] can be used for session wide stuff
+    # Round 0 of the DebugLog can be used for session wide stuff
 
     return {
         'actual_round_number': actual_round_number,
         'preference_role': sub_session.get_groups()[0].preference_role,
-        'session_log_lines': sub_session.session.debug_log[0],
-        'log_lines': sub_session.session.debug_log[actual_round_number],
+        'session_log_lines': DebugLog.lines(sub_session.session.code, 0),
+        'log_lines': DebugLog.lines(sub_session.session.code,
+                                    actual_round_number),
+        'queue_stats': Queues.stats(sub_session.session.code) +
+                       [SingleFlight.stats(), MicroBatch.stats(),
+                        RESPONSE_CACHE.stats(), DB_WRITER.stats(),
+                        OUTBOX.stats(), Heartbeat.stats()] +
+                       PREFIX_CACHE.stats_lines(),
     }
 
 
@@ -213,9 +227,6 @@ class Player(BasePlayer):
     quality_proposed = models.IntegerField()
     quality_accepted = models.IntegerField()
 
-    offers = JsonField(initial=[])
-    chat_data = JsonField(initial=[])
-    llm_interactions = JsonField()
     bot_vars = JsonField(initial={})
 
     preference = models.StringField(max_length=20, choices=C.TYPE_CHOICES)
@@ -261,6 +272,60 @@ class Player(BasePlayer):
             offer = f"€ {price}<br>{quality}"
         return offer
 
+    @property
+    def negotiators(self) -> List['Player']:
+        """ Players whose records make up the negotiation """
+        return [self] if self.bot_opponent else [self, self.other]
+
+    @cached_property
+    def record_cache(self) -> Dict[type, List[Dict[str, Any]]]:
+        """ Decoded records per model, loaded once per request """
+        return {}
+
+    def cached_records(self, model) -> List[Dict[str, Any]]:
+        if model not in self.record_cache:
+            self.record_cache[model] = [
+                decoded(model, record) for record in records(
+                    model, [self] if model is InteractionRecord
+                    else self.negotiators)]
+        return self.record_cache[model]
+
+    def cache_records(self, model, rows: List[Dict[str, Any]]):
+        """ New records, also those written by the DB writer """
+        for player in self.negotiators:
+            if model in player.record_cache:
+                player.record_cache[model] += [decoded(model, row)
+                                               for row in rows]
+
+    @property
+    def offers(self) -> List[Dict[str, Any]]:
+        return self.cached_records(OfferRecord)
+
+    @property
+    def chat_data(self) -> List[Dict[str, str]]:
+        return [{'nick': f"{row['role']} (Me)"
+                 if row['idx'] == self.id_in_group else row['role'],
+                 'body': row['body']}
+                for row in self.cached_records(ChatRecord)]
+
+    @property
+    def llm_interactions(self) -> List[Dict[str, str]]:
+        return self.cached_records(InteractionRecord)
+
+    def add_records(self, model, rows: List[Dict[str, Any]]):
+        add_records(db, model, self.id, rows)
+        self.cache_records(model, rows)
+
+    def add_offers(self, offers: List[Dict[str, Any]]):
+        self.add_records(OfferRecord, offer_rows(offers))
+
+    def add_chat(self, idx: int, role: str, body: str):
+        self.add_records(ChatRecord,
+                         [{'idx': idx, 'role': role, 'body': body}])
+
+    def add_interactions(self, interactions: List[Dict[str, str]]):
+        self.add_records(InteractionRecord, interactions)
+
     @property
     def live_ids(self) -> List[int]:
         return [idx for idx in [self.id_in_group, self.other_id] if idx > 0]
@@ -275,15 +340,14 @@ class Player(BasePlayer):
 
     def process_offer(self, price: int, quality: int) -> List[Dict[str, int]]:
         """ Offer made via the interface """
-        assert isinstance(self.offers, list)
         self.price_proposed = price
         self.quality_proposed = quality
 
         offer_user = Offer(idx=self.id_in_group, price=price, quality=quality)
-        self.offers = self.offers + [offer_user]
-        if not self.bot_opponent:
-            self.other.offers = self.other.offers + [offer_user]
-        else:
+        if self.bot_opponent:
+            self.other.add_profits(offer_user)
+        self.add_offers([offer_user])
+        if self.bot_opponent:
             self.other.receive_offer_from_human(price, quality)
 
         return self.offers
@@ -305,17 +369,14 @@ class Player(BasePlayer):
 
     def process_chat(self, data: Dict[str, Any]) -> Dict[int, Any]:
         """ Process a chat message from the user """
-        assert isinstance(self.chat_data, list)
         body = data['body']
 
-        tmp = self.chat_data + [{'nick': f"{self.role} (Me)", 'body': body}]
-        self.chat_data = tmp
-        result = {self.id_in_group: {'chat': self.chat_data}}
+        self.add_chat(self.id_in_group, self.role, body)
+        result = {self.id_in_group: {'chat_delta': last(self.chat_data)}}
 
         if not self.bot_opponent:
-            tmp = self.other.chat_data + [{'nick': self.role, 'body': body}]
-            self.other.chat_data = tmp
-            result[self.other.id_in_group] = {'chat': self.other.chat_data}
+            result[self.other.id_in_group] = {
+                'chat_delta': last(self.other.chat_data)}
         else:
             self.other.receive_chat_from_human(body)
 
@@ -323,10 +384,13 @@ class Player(BasePlayer):
 
     def process_llm_output(self, role: str, body: str) -> Dict[str, Any]:
         """ Send LLM output to the user """
-        assert isinstance(self.chat_data, list)
-        tmp = self.chat_data + [{'nick': f"{role}", 'body': body}]
-        self.chat_data = tmp
-        return {'chat': self.chat_data}
+        self.add_chat(-1, role, body)
+        return {'chat_delta': last(self.chat_data)}
+
+    def resync(self, chat_seq: int, offers_seq: int) -> Dict[str, Any]:
+        """ Everything the browser missed, e.g. while reconnecting """
+        return {'chat_delta': delta(self.chat_data, chat_seq),
+                'offers_delta': delta(self.offers, offers_seq)}
 
     def calculate_profits(self) -> Tuple[int, int]: 
         demand=self.group.demand
@@ -342,43 +406,120 @@ class Player(BasePlayer):
             return supplier_profit, buyer_profit
 
 
+# Append-only, one row per offer, chat message or LLM interaction. A record
+# belongs to the player who made it, the bot's records go on the human player.
+# The id gives the order, rows from the DB writer thread included.
+class OfferRecord(ExtraModel):
+    player = models.Link(Player)
+    data = models.LongStringField()
+
+
+class ChatRecord(ExtraModel):
+    player = models.Link(Player)
+    # id_in_group of the author, -1 for the bot
+    idx = models.IntegerField()
+    role = models.StringField()
+    body = models.LongStringField()
+
+
+class InteractionRecord(ExtraModel):
+    player = models.Link(Player)
+    role = models.StringField()
+    content = models.LongStringField()
+
+
+# Live frames carry only new items, 'seq' is the index of the first one.
+# Full lists are only sent on page load, in js_vars.
+def delta(items: List[Any], seq: int) -> Dict[str, Any]:
+    return {'seq': seq, 'items': items[seq:]}
+
+
+def last(items: List[Any]) -> Dict[str, Any]:
+    return delta(items, max(len(items) - 1, 0))
+
+
+def add_records(session, model, player_id: int, rows: List[Dict[str, Any]]):
+    """ Also used on the DB writer thread, with its own session """
+    for row in rows:
+        session.add(model(player_id=player_id, **row))
+
+
+def offer_rows(offers: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [{'data': dumps(offer)} for offer in offers]
+
+
+# Columns of a record as the lists of Player hold them
+RECORD_FIELDS = {OfferRecord: ['data'],
+                 ChatRecord: ['idx', 'role', 'body'],
+                 InteractionRecord: ['role', 'content']}
+
+
+def decoded(model, record: Union[ExtraModel, Dict[str, Any]]) -> Dict[str, Any]:
+    """ A stored record or a row to be stored, offers are decoded """
+    if isinstance(record, dict):
+        row = record
+    else:
+        row = {field: getattr(record, field) for field in RECORD_FIELDS[model]}
+    if model is OfferRecord:
+        return loads(row['data'])
+    return {field: row[field] for field in RECORD_FIELDS[model]}
+
+
+def records(model, players: List[Player]) -> List[ExtraModel]:
+    """ Records of the players in the order they were made """
+    return db.query(model) \
+        .filter(model.player_id.in_([player.id for player in players])) \
+        .order_by(model.id).all()
+
+
+def custom_export(players: List[Player]):
+    yield ['session_code', 'participant_code', 'round_number', 'id_in_group',
+           'record', 'seq', 'idx', 'role', 'content']
+    for player in players:
+        common = [player.session.code, player.participant.code,
+                  player.round_number, player.id_in_group]
+        # seq counts the records of a player, in the order of their id
+        for seq, record in enumerate(OfferRecord.filter(player=player)):
+            offer = loads(record.data)
+            yield common + ['offer', seq, offer['idx'], '', record.data]
+        for seq, record in enumerate(ChatRecord.filter(player=player)):
+            yield common + ['chat', seq, record.idx, record.role, record.body]
+        for seq, record in enumerate(InteractionRecord.filter(player=player)):
+            yield common + ['interaction', seq, '', record.role,
+                            record.content]
+
+
 class BotProfits(ExtraModel):
+    """ Ledger with one row per profit a bot made in a round """
     sub_session = models.Link(Subsession)
-    profit_role = models.LongStringField()
-    selected_profits = models.LongStringField()
-
-    @classmethod
-    def create_new(cls, sub_session: Subsession):
-        empty = json.dumps({C.ROLE_SUPPLIER: [], C.ROLE_BUYER: []})
-        cls.create(sub_session=sub_session, profit_role=empty)
+    role = models.StringField()
+    profit = models.FloatField()
+    # Random key, the highest of a round and role is drawn for the payment
+    draw = models.FloatField()
+    selected = models.BooleanField(initial=False)
 
     @classmethod
-    def update(cls, sub_session: Subsession, role: str, profit: int):
+    def update(cls, sub_session: Subsession, role: str, profit: float):
         # We are adding the profits that all bots are making # split by bot role
         # We can only know all bot profits at the last round
-        idx = cls.filter(sub_session=sub_session)[0].id
-        bod_profits = cls.objects_get(id=idx)
-        profit_role = json.loads(bod_profits.profit_role)
-        profit_role[role].append(profit)
-        bod_profits.profit_role = json.dumps(profit_role)
-        db.commit()
+        cls.create(sub_session=sub_session, role=role, profit=profit,
+                   draw=random.random())
 
     @classmethod
-    def select_profits(cls, group: Group):
-        selected_dict = {C.ROLE_SUPPLIER: [], C.ROLE_BUYER: []}
-        for sub_session in group.session.get_subsessions()[2:]:
-            idx = cls.filter(sub_session=sub_session)[0].id
-            bot_profits = cls.objects_get(id=idx)
-            profit_role = json.loads(bot_profits.profit_role)
-            for role in C.ROLES:
-                random_profit = random.sample(profit_role[role] or [0], 1)
-                selected_dict[role].append(random_profit)
-        # Put the selected profits on the last sub_session
-        bot_profits.selected_profits = json.dumps(selected_dict)
-        db.commit()
+    def ledger(cls, session, *columns):
+        """ Rows of the paid rounds (3 and later) of the session """
+        return db.query(*columns) \
+            .join(Subsession) \
+            .filter(Subsession.session_id == session.id,
+                    Subsession.round_number > 2)
 
     @classmethod
-    def get_role_key_lists(cls, player: Player) -> List[List[int]]:
-        bot_profits = BotProfits.filter(sub_session=player.subsession)[0]
-        selected_profits = json.loads(bot_profits.selected_profits)
-        return selected_profits[player.role]
+    def select_profits(cls, group: Group):
+        """ One profit per round and role, in a single UPDATE """
+        drawn = cls.ledger(group.session, func.max(cls.draw)) \
+            .group_by(Subsession.round_number, cls.role)
+        db.query(cls) \
+            .filter(cls.id.in_(cls.ledger(group.session, cls.id))) \
+            .update({cls.selected: cls.draw.in_(drawn)},
+                    synchronize_session=False)
+        db.commit()
@@ -1,5 +1,6 @@
+import re
 import time
-from typing import Any, Union
+from typing import Any, Optional, Union
 from .constants import C
 
 ACCEPT = 'accept'
@@ -11,6 +12,15 @@ TOO_UNFAVOURABLE = 'too_unfavourable'
 NOT_PROFITABLE_FIND_OTHER_PRICE = 'not_profitable_find_other_price'
 NOT_PROFITABLE_FIND_OTHER_QUANTITY = 'not_profitable_find_other_quantity'
 
+# A number with what is around it, e.g. "€ 7.50", "7,5 euro", "40 units"
+PATTERN_NUMBER = re.compile(
+    r'(€\s*)?(\d+(?:[.,]\d+)?)\s*(€|eur(?:o|os)?\b|units?\b|bags?\b|'
+    r'pieces?\b|items?\b)?', re.IGNORECASE)
+PATTERN_PRICE_WORD = re.compile(r'(price|pay|cost|€|eur)\w*\W*(of|at|is)?\W*$',
+                                re.IGNORECASE)
+PATTERN_QUANTITY_WORD = re.compile(
+    r'(quantit|amount|units?|bags?|order)\w*\W*(of|at|is)?\W*$', re.IGNORECASE)
+
 
 class Offer(dict):
     def __init__(self,
@@ -315,3 +325,40 @@ class OfferList(list):
     def min_profit(self) -> int:
         # Only check for user offers
         return min([offer.profit_bot for offer in self if offer.idx != -1])
+
+
+def parse_offer(message: str, idx: int) -> Offer:
+    """ Reads price and quality from a message without the reader model
+
+    A number is a price when a currency sign or a price word is next to it,
+    a quality when a unit or quantity word is. Otherwise decimals and
+    numbers up to the maximum price are prices, the rest qualities.
+    """
+    price: Optional[float] = None
+    quality: Optional[int] = None
+    unlabeled = []
+    for match in PATTERN_NUMBER.finditer(message):
+        number = float(match.group(2).replace(',', '.'))
+        unit = (match.group(3) or '').lower()
+        before = message[max(0, match.start() - 20):match.start()]
+        if price is None and (match.group(1) or
+                              unit.startswith(('€', 'eur')) or
+                              PATTERN_PRICE_WORD.search(before)):
+            price = number
+        elif quality is None and (unit or PATTERN_QUANTITY_WORD.search(before)):
+            quality = round(number)
+        else:
+            unlabeled.append((number, match.group(2)))
+
+    for number, text in unlabeled:
+        is_decimal = '.' in text or ',' in text
+        if price is None and (is_decimal or number <= C.PRICE_MAX):
+            price = number
+        elif quality is None and not is_decimal:
+            quality = round(number)
+
+    if price is not None:
+        price = round(price, 2)
+    return Offer(idx=idx, from_chat=True, price=price, quality=quality,
+                 test="parse_offer")
+
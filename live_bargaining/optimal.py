@@ -222,6 +222,20 @@ def optimal_quality_for_wholesale_price(offer: Offer, constraint_bot, constraint
     return (None, None)
 
 
+def optimal_solution(constraint_user: int,
+                     constraint_bot: int,
+                     evaluation: str,
+                     offer: Offer) -> Tuple[float, int]:
+    """ The counteroffer (price, quality) for an evaluated offer """
+    if evaluation == OFFER_PRICE or evaluation == NOT_PROFITABLE_FIND_OTHER_QUANTITY:
+        return optimal_quality_for_wholesale_price(offer, constraint_bot, constraint_user)
+    elif evaluation == OFFER_QUALITY  or evaluation == NOT_PROFITABLE_FIND_OTHER_PRICE:
+        return optimal_wholesale_price_for_quality(offer, constraint_bot, constraint_user)
+    elif evaluation == TOO_UNFAVOURABLE or evaluation == NOT_OFFER:
+        return nash_bargaining_solution(constraint_bot, constraint_user)['offer']
+    return (None, None)
+
+
 def optimal_solution_string(constraint_user: int,
                             constraint_bot: int,
                             evaluation: str,
@@ -231,13 +245,9 @@ def optimal_solution_string(constraint_user: int,
 
     if evaluation == ACCEPT:
         return ''
-    elif evaluation == OFFER_PRICE or evaluation == NOT_PROFITABLE_FIND_OTHER_QUANTITY:
-        optimal_price, optimal_quality = optimal_quality_for_wholesale_price(offer, constraint_bot, constraint_user)
-    elif evaluation == OFFER_QUALITY  or evaluation == NOT_PROFITABLE_FIND_OTHER_PRICE:
-        optimal_price, optimal_quality = optimal_wholesale_price_for_quality(offer, constraint_bot, constraint_user)
-    elif evaluation == TOO_UNFAVOURABLE or evaluation == NOT_OFFER:
-        optimal_price, optimal_quality = nash_bargaining_solution(constraint_bot, constraint_user)['offer']
     elif evaluation == INVALID_OFFER:
         return (None, None)
+    optimal_price, optimal_quality = optimal_solution(
+        constraint_user, constraint_bot, evaluation, offer)
     print(f"[DEBUG optimal_solution_string] optimal_price: {optimal_price}, optimal_quality: {optimal_quality}, target_profit: {target}")
-    return PROMPTS['offer_string'] % (optimal_price, optimal_quality)
\ No newline at end of file
+    return PROMPTS['offer_string'] % (optimal_price, optimal_quality)
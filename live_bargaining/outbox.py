@@ -0,0 +1,97 @@
+import asyncio
+import time
+from typing import Any, Dict, Optional, Set
+
+from otree.channels import utils as channel_utils
+
+Frame = Dict[str, Any]
+
+
+def merge(frame: Frame, data: Frame):
+    """ Adds an update to a pending frame, deltas of one list are joined """
+    for key, value in data.items():
+        old = frame.get(key)
+        if key.endswith('_delta') and old is not None and \
+                old['seq'] <= value['seq'] <= old['seq'] + len(old['items']):
+            items = old['items'][:value['seq'] - old['seq']] + value['items']
+            frame[key] = {'seq': old['seq'], 'items': items}
+        else:
+            frame[key] = value
+
+
+class Pending:
+    def __init__(self):
+        self.frame: Frame = {}
+        self.since = time.monotonic()
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class Outbox:
+    """ Updates for a group channel within a short window go out as one frame
+
+    The bots add their updates, a frame is sent when the window closes or the
+    turn ends, whichever comes first. The send tasks are kept until done.
+    """
+    def __init__(self):
+        self.pending: Dict[str, Pending] = {}
+        self.tasks: Set[asyncio.Task] = set()
+        # Frames per group since its last turn ended
+        self.turn_frames: Dict[str, int] = {}
+        self.updates = 0
+        self.frames = 0
+        self.turns = 0
+        self.failed = 0
+        self.latency = 0.0
+        self.latency_max = 0.0
+
+    def add(self, group: str, data: Frame, window: float = 0.0):
+        self.updates += 1
+        pending = self.pending.get(group)
+        if pending is None:
+            pending = self.pending[group] = Pending()
+            if window > 0:
+                pending.timer = asyncio.get_event_loop().call_later(
+                    window, self.flush, group)
+        merge(pending.frame, data)
+        if window <= 0:
+            self.flush(group)
+
+    def flush(self, group: str):
+        pending = self.pending.pop(group, None)
+        if pending is None:
+            return
+        if pending.timer is not None:
+            pending.timer.cancel()
+        self.frames += 1
+        self.turn_frames[group] = self.turn_frames.get(group, 0) + 1
+        task = asyncio.ensure_future(self.send(group, pending))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    def end_turn(self, group: str):
+        self.flush(group)
+        # Turns without any frame, e.g. summaries, are not counted
+        if self.turn_frames.pop(group, 0):
+            self.turns += 1
+
+    async def send(self, group: str, pending: Pending):
+        try:
+            await channel_utils.group_send(group=group, data=pending.frame)
+        except Exception as e:
+            self.failed += 1
+            return
+        latency = time.monotonic() - pending.since
+        self.latency += latency
+        self.latency_max = max(self.latency_max, latency)
+
+    def stats(self) -> str:
+        sent = self.frames - self.failed - len(self.tasks)
+        per_turn = self.frames / self.turns if self.turns else 0
+        average = self.latency / sent if sent > 0 else 0
+        return f"Outbox: {self.frames} frames for {self.updates} updates, " \
+               f"{per_turn:.1f} per turn, latency {average * 1000:.0f} ms " \
+               f"average, {self.latency_max * 1000:.0f} ms max, " \
+               f"{len(self.tasks)} sending, {self.failed} failed"
+
+
+OUTBOX = Outbox()
@@ -5,8 +5,8 @@ from otree.api import *
 
 from . import Offer
 from .constants import C
-from .models import Player, Group, Subsession, BotProfits
-from .utils import now_datetime, get_start_time
+from .models import Player, Group, Subsession, BotProfits, last
+from .utils import now_datetime, get_start_time, get_timeout_seconds
 
 import settings
 
@@ -220,9 +220,7 @@ class Bargain(Page):
 
     @staticmethod
     def get_timeout_seconds(player: Player) -> int:
-        if player.round_number == 1:
-            return player.session.config['timeout_bargain_round1']
-        return player.session.config['timeout_bargain']
+        return get_timeout_seconds(player)
 
     @staticmethod
     def js_vars(player: Player) -> Dict[str, Any]:
@@ -254,6 +252,7 @@ class Bargain(Page):
     @staticmethod
     def live_method(player: Player, data: Dict[str, Any]) \
             -> Optional[Dict[int, Dict[str, Any]]]:
+        # Normally answered by Heartbeat, without the database
         if data['type'] == 'ping':
             return {}
 
@@ -265,11 +264,16 @@ class Bargain(Page):
         if data['type'] == 'chat':
             return player.process_chat(data)
 
+        if data['type'] == 'resync':
+            return {player.id_in_group: player.resync(data['chat'],
+                                                      data['offers'])}
+
         price = data['price']
         quality = data['quality']
         if data['type'] == 'propose':
             offers = player.process_offer(price, quality)
-            return {idx: {'offers': offers} for idx in player.live_ids}
+            return {idx: {'offers_delta': last(offers)}
+                    for idx in player.live_ids}
         if data['type'] == 'accept':
             player.process_accept(price, quality)
             return {idx: {'finished': True} for idx in player.live_ids}
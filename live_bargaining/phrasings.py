@@ -0,0 +1,112 @@
+""" Pre-generated replies for turns where the decision is already made
+
+Generate the pool offline with the same models and prompts as the bot:
+
+    python -m live_bargaining.phrasings http://localhost:11434 10
+"""
+import json
+import os
+import random
+import sys
+from typing import Dict, List, Optional
+
+from .constants import C, Config
+from .offer import ACCEPT, INVALID_OFFER
+from .prompts import PROMPTS, offer_invalid, system_final_prompt
+from .templates import ACCEPT_FROM_CHAT, REPLIES
+
+PHRASINGS_FILE = './prompts/phrasings.json'
+
+# Used until a pool has been generated
+INVALID_REMINDER = \
+    "The offer received is invalid because the Price or Quantity are out " \
+    "of bounds. Remember, Quantity ranges from 1 to 100 with no decimals."
+
+DEFAULT_PHRASINGS = {
+    role: {
+        ACCEPT: REPLIES[role][ACCEPT],
+        ACCEPT_FROM_CHAT: REPLIES[role][ACCEPT_FROM_CHAT],
+        INVALID_OFFER: [INVALID_REMINDER],
+    } for role in C.ROLES
+}
+
+
+def load_phrasings(file_name: str = PHRASINGS_FILE) \
+        -> Dict[str, Dict[str, List[str]]]:
+    phrasings = {role: dict(labels)
+                 for role, labels in DEFAULT_PHRASINGS.items()}
+    try:
+        with open(file_name, 'r') as f:
+            generated = json.load(f)
+    except (OSError, ValueError):
+        return phrasings
+    for role, labels in generated.items():
+        for label, replies in labels.items():
+            if replies:
+                phrasings[role][label] = replies
+    return phrasings
+
+
+PHRASINGS = load_phrasings()
+
+
+def fast_reply(role: str, label: str) -> Optional[str]:
+    replies = PHRASINGS.get(role, {}).get(label)
+    return random.choice(replies) if replies else None
+
+
+def prompts_to_generate(role: str) -> Dict[str, str]:
+    # A neutral counterpart message, the phrasings must fit any offer
+    user_message = PROMPTS['offer_string'] % ('the proposed price',
+                                              'the proposed quantity')
+    config = {'roles': {'bot_role': role}}
+    return {
+        ACCEPT: PROMPTS['accept_from_interface'] + user_message,
+        ACCEPT_FROM_CHAT: PROMPTS['accept_from_chat'] + user_message,
+        INVALID_OFFER: offer_invalid(config, user_message),
+    }
+
+
+def generate(llm_host: str, count: int, config: Config,
+             file_name: str = PHRASINGS_FILE):
+    from ollama import Client
+    from .bot_llm import BotLLM
+
+    client = Client(host=llm_host)
+    generated = {}
+    for role in C.ROLES:
+        constraints = range(config['production_cost_low'],
+                            config['production_cost_high'] + 1) \
+            if role == C.ROLE_SUPPLIER else \
+            range(config['market_price_low'], config['market_price_high'] + 1)
+        generated[role] = {}
+        for label, content in prompts_to_generate(role).items():
+            replies = set()
+            for i in range(count):
+                constraint = constraints[i % len(constraints)]
+                system = system_final_prompt({
+                    'roles': {'bot_role': role},
+                    'production_cost': constraint,
+                    'market_price': constraint})
+                response = client.chat(
+                    model=config['llm_model'],
+                    options={'temperature': config['llm_temp']},
+                    messages=[{"role": "system", "content": system},
+                              {"role": "user", "content": content}])
+                reply = BotLLM.extract_content(response)
+                # An acceptance must not repeat terms of a specific offer
+                if reply and (label == INVALID_OFFER or
+                              not any(c.isdigit() for c in reply)):
+                    replies.add(reply)
+            generated[role][label] = sorted(replies)
+            print(role, label, len(replies))
+
+    os.makedirs(os.path.dirname(file_name), exist_ok=True)
+    with open(file_name, 'w') as f:
+        json.dump(generated, f, indent=2)
+
+
+if __name__ == '__main__':
+    from settings import SESSION_CONFIG_DEFAULTS
+
+    generate(sys.argv[1], int(sys.argv[2]), SESSION_CONFIG_DEFAULTS)
@@ -0,0 +1,203 @@
+""" Post-processing of generated replies before they are sent to the user
+
+A pipeline is an ordered list of stages, each a precompiled pattern applied
+once per reply. Check the recorded corpus and measure throughput with:
+
+    python -m live_bargaining.post_process [repeat]
+"""
+import json
+import os
+import re
+import string
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+# A stage returns the new content and the removed fragments
+Stage = Callable[[str], Tuple[str, List[str]]]
+
+CORPUS_FILE = os.path.join(os.path.dirname(__file__), 'post_process.json')
+
+# 'System:' and 'System,' in front of the reply, each stripped once
+PATTERN_SYSTEM_COLON = re.compile(r'^system:', re.IGNORECASE | re.ASCII)
+PATTERN_SYSTEM_COMMA = re.compile(r'^system,', re.IGNORECASE | re.ASCII)
+# From the first '(' to the next ')', nested brackets are not balanced
+PATTERN_PARENTHESES = re.compile(r'\([^)]*\)')
+PATTERN_LEADING = re.compile(r'^[^a-zA-Z0-9]+')
+# Reasoning of e.g. deepseek-r1 and qwen3, also when cut off by num_predict
+PATTERN_THINK = re.compile(r'<think>.*?(?:</think>|\Z)', re.DOTALL)
+ALPHANUMERIC = frozenset(string.ascii_letters + string.digits)
+
+
+def after(separator: str, count: int = 1, tag: str = '') -> Stage:
+    """ Keep the text after the count-th separator (or the last one) """
+    def stage(content: str) -> Tuple[str, List[str]]:
+        parts = content.split(separator, count)
+        if len(parts) == 1:
+            return content, []
+        before = content[:len(content) - len(parts[-1]) - len(separator)]
+        return parts[-1].strip(), [tag + before.strip()]
+    return stage
+
+
+def drop(pattern: re.Pattern, marker: str, tag: str = '') -> Stage:
+    """ Remove all matches, only searched for if marker is in the content """
+    def stage(content: str) -> Tuple[str, List[str]]:
+        if marker not in content:
+            return content, []
+        removed = pattern.findall(content)
+        if not removed:
+            return content, []
+        return pattern.sub('', content), [tag + text for text in removed]
+    return stage
+
+
+def strip_prefix(pattern: re.Pattern, tag: str = '') -> Stage:
+    def stage(content: str) -> Tuple[str, List[str]]:
+        match = pattern.match(content)
+        if match is None:
+            return content, []
+        return content[match.end():].strip(), [tag + match.group()]
+    return stage
+
+
+def quoted(min_length: int, otherwise: List[Stage] = (),
+           tags: Tuple[str, str] = ('', '')) -> Stage:
+    """ The text between the first and last quote if it is longer than
+    min_length, else the otherwise stages
+
+    Short quoted text is usually a term of the offer, not the reply.
+    """
+    def stage(content: str) -> Tuple[str, List[str]]:
+        start = content.find('"') + 1
+        end = content.rfind('"')
+        if end - start <= min_length:
+            return run_stages(otherwise, content)
+        return content[start:end], [tags[0] + content[:start],
+                                    tags[1] + content[end:]]
+    return stage
+
+
+def unquoted(stages: List[Stage], otherwise: List[Stage] = ()) -> Stage:
+    """ The stages if the content has no quoted text, else the otherwise
+    stages """
+    def stage(content: str) -> Tuple[str, List[str]]:
+        if content.count('"') > 1:
+            return run_stages(otherwise, content)
+        return run_stages(stages, content)
+    return stage
+
+
+def leading(content: str) -> Tuple[str, List[str]]:
+    """ Remove leading characters that are not a-z, A-Z or 0-9 """
+    if not content or content[0] in ALPHANUMERIC:
+        return content, []
+    match = PATTERN_LEADING.match(content)
+    return content[match.end():], [match.group()]
+
+
+def first_line(tag: str = '') -> Stage:
+    def stage(content: str) -> Tuple[str, List[str]]:
+        line, newline, rest = content.partition('\n')
+        return line, [tag + rest] if newline else []
+    return stage
+
+
+def strip_quotes(content: str) -> Tuple[str, List[str]]:
+    stripped = content.strip().strip('"')
+    return stripped, ['"'] if len(stripped) < len(content.strip()) else []
+
+
+def strip(content: str) -> Tuple[str, List[str]]:
+    return content.strip(), []
+
+
+def run_stages(stages: List[Stage], content: str) -> Tuple[str, List[str]]:
+    removed = []
+    for stage in stages:
+        content, fragments = stage(content)
+        removed += fragments
+    return content, removed
+
+
+PIPELINES: Dict[str, List[Stage]] = {
+    # The bots in live_bargaining
+    'default': [
+        unquoted([strip_prefix(PATTERN_SYSTEM_COLON),
+                  strip_prefix(PATTERN_SYSTEM_COMMA)],
+                 otherwise=[quoted(30)]),
+        drop(PATTERN_PARENTHESES, '('),
+        after('optimal_offer'),
+        # Internal thoughts and labels in front of the reply
+        after(':', 3),
+        after('Here is the most efficient offer', 3),
+        after('response', 3),
+        leading,
+        first_line(),
+        strip_quotes,
+    ],
+    # The bots in the test app, the removed fragments are tagged for the log
+    'test': [
+        after(':', tag='[:]'),
+        first_line('[EOL]'),
+        quoted(0, otherwise=[drop(PATTERN_PARENTHESES, '(', '[B]')],
+               tags=('[Q1]', '[Q2]')),
+        strip_prefix(PATTERN_SYSTEM_COLON, '[SYS]'),
+        strip_prefix(PATTERN_SYSTEM_COMMA, '[SYS]'),
+        strip,
+    ],
+}
+
+# Models that think out loud before the reply, then as the default
+PIPELINES['reasoning'] = [drop(PATTERN_THINK, '<think>'), strip] + \
+    PIPELINES['default']
+
+# Models whose replies need another pipeline than 'default', without the tag
+MODEL_PIPELINES: Dict[str, str] = {
+    'deepseek-r1': 'reasoning',
+    'qwen3': 'reasoning',
+}
+
+
+def pipeline_for(model: Optional[str]) -> str:
+    return MODEL_PIPELINES.get((model or '').split(':')[0], 'default')
+
+
+def post_process(content: str, pipeline: str = 'default') -> Tuple[str, str]:
+    """ The reply to send, and the removed fragments one per line """
+    content, removed = run_stages(PIPELINES[pipeline], content.strip())
+    return content, '\n'.join(removed)
+
+
+def check_corpus(file_name: str = CORPUS_FILE, repeat: int = 100) -> bool:
+    with open(file_name, 'r') as f:
+        corpus = json.load(f)
+
+    passed = True
+    for pipeline, cases in corpus.items():
+        for case in cases:
+            content, removed = post_process(case['raw'], pipeline)
+            if content != case['expected']:
+                passed = False
+                print(f"FAIL {pipeline}: {case['raw']!r}\n"
+                      f"     expected {case['expected']!r}\n"
+                      f"     got      {content!r}")
+            if removed != case.get('removed', removed):
+                passed = False
+                print(f"FAIL {pipeline} removed: {case['raw']!r}\n"
+                      f"     expected {case['removed']!r}\n"
+                      f"     got      {removed!r}")
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for case in cases:
+                post_process(case['raw'], pipeline)
+        seconds = time.perf_counter() - start
+        print(f"{pipeline}: {len(cases)} replies, "
+              f"{repeat * len(cases) / seconds:.0f} replies/s")
+    return passed
+
+
+if __name__ == '__main__':
+    sys.exit(0 if check_corpus(repeat=int(sys.argv[1])
+                               if len(sys.argv) > 1 else 100) else 1)
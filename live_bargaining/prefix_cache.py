@@ -0,0 +1,62 @@
+import hashlib
+from typing import Any, Dict, List, Optional
+
+from .conversation import estimate_tokens
+
+
+class PrefixStats:
+    def __init__(self):
+        self.calls = 0
+        self.tokens_saved = 0
+        self.seconds_saved = 0.0
+
+
+class PrefixCache:
+    """ Which host last evaluated a system prompt, and what reuse saved
+
+    Ollama keeps the evaluated prompt of a loaded model and only evaluates
+    the part after the longest common prefix. Sending a bot back to the same
+    host (with the static system prompt first) skips most of the prefill.
+    """
+    def __init__(self):
+        self.hosts: Dict[str, str] = {}
+        self.stats: Dict[str, PrefixStats] = {}
+
+    @staticmethod
+    def key(model: str, messages: List[Dict[str, str]]) -> Optional[str]:
+        if not messages or messages[0]['role'] != 'system':
+            return None
+        prefix = model + messages[0]['content']
+        return hashlib.sha256(prefix.encode()).hexdigest()
+
+    def host_for(self, key: Optional[str]) -> Optional[str]:
+        return self.hosts.get(key)
+
+    def record(self, key: Optional[str], llm_host: str,
+               messages: List[Dict[str, str]], response: Dict[str, Any]):
+        if key is None:
+            return
+        self.hosts[key] = llm_host
+
+        stats = self.stats.setdefault(llm_host, PrefixStats())
+        stats.calls += 1
+        # Tokens Ollama did not have to evaluate, estimated from the text
+        evaluated = response.get('prompt_eval_count') or 0
+        duration = response.get('prompt_eval_duration') or 0
+        total = sum(estimate_tokens(m['content']) for m in messages)
+        saved = max(0, total - evaluated)
+        stats.tokens_saved += saved
+        if evaluated:
+            # Durations are in nanoseconds
+            stats.seconds_saved += saved * duration / evaluated / 1e9
+
+    def stats_lines(self) -> List[str]:
+        return [f"LLM prefix reuse {llm_host}: {stats.calls} calls, "
+                f"~{stats.tokens_saved} tokens, "
+                f"~{stats.seconds_saved:.1f}s prompt evaluation saved"
+                for llm_host, stats in self.stats.items()]
+
+
+# Shared by all bots, participants with the same role and constraint share
+# the same system prompt
+PREFIX_CACHE = PrefixCache()
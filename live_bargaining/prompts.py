@@ -173,6 +173,14 @@ PROMPTS = {
         'What combination of Price and Quality do you have in mind '
         'to sell me a 10kg pellet bag?',
 
+    'summarize_conversation':
+        'Summarize this negotiation between a Supplier and a Retailer in at '
+        'most 60 words. Keep every price and quantity that was proposed, '
+        'by whom, and whether it was rejected. Only output the summary.\n'
+        'Summary so far: %s\n'
+        'Messages to add (role system is you, role user is the counterpart): '
+        '%s',
+
     'understanding_offer':
         'Here is the negotiator message you need to read: ',
 
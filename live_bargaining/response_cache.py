@@ -0,0 +1,145 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from .constants import Config
+
+
+class ResponseCache:
+    """ LLM replies per (model, temperature, prompt), in memory and on disk
+
+    With a variety of n, the first n requests for a prompt still go to the
+    LLM, after that the stored replies are used in turn. Generations are
+    counted, not distinct replies: at a low temperature the n generations
+    may all be the same reply. Files are read, written and removed on a
+    worker thread.
+    """
+    # Seconds between sweeps of the disk tier for expired files
+    SWEEP_INTERVAL = 60 * 60
+
+    def __init__(self):
+        self.entries: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.swept_at = 0.0
+
+    @staticmethod
+    def key(model: str, temperature: float,
+            messages: List[Dict[str, str]]) -> str:
+        dumped = json.dumps([model, temperature, messages], sort_keys=True)
+        return hashlib.sha256(dumped.encode()).hexdigest()
+
+    @staticmethod
+    def _file_name(key: str, config: Config) -> str:
+        return os.path.join(config['llm_cache_dir'], f"{key}.json")
+
+    async def _load(self, key: str,
+                    config: Config) -> Optional[Dict[str, Any]]:
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = await asyncio.get_running_loop().run_in_executor(
+                None, self._read, self._file_name(key, config))
+            if entry is None:
+                return None
+            # Files written before generations were counted
+            entry.setdefault('generations', len(entry['responses']))
+            self._remember(key, entry, config)
+
+        if time.time() > entry['created'] + config['llm_cache_ttl']:
+            self.entries.pop(key, None)
+            self._in_thread(self._remove, self._file_name(key, config))
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    def _remember(self, key: str, entry: Dict[str, Any], config: Config):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > config['llm_cache_size']:
+            self.entries.popitem(last=False)
+
+    async def get(self, key: str, config: Config) -> Optional[str]:
+        entry = await self._load(key, config)
+        if entry is None or \
+                entry['generations'] < config['llm_cache_variety']:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        content = entry['responses'][entry['next'] % len(entry['responses'])]
+        entry['next'] += 1
+        return content
+
+    async def put(self, key: str, content: str, config: Config):
+        entry = await self._load(key, config) or \
+            {'created': time.time(), 'responses': [], 'generations': 0,
+             'next': 0}
+        if entry['generations'] >= config['llm_cache_variety']:
+            return
+        entry['generations'] += 1
+        if content not in entry['responses']:
+            entry['responses'].append(content)
+        self._remember(key, entry, config)
+
+        self._in_thread(self._write, config['llm_cache_dir'],
+                        self._file_name(key, config), json.dumps(entry))
+        if time.time() > self.swept_at + self.SWEEP_INTERVAL:
+            self.swept_at = time.time()
+            self._in_thread(self._sweep, config['llm_cache_dir'],
+                            config['llm_cache_ttl'])
+
+    @staticmethod
+    def _in_thread(function, *args):
+        asyncio.get_running_loop().run_in_executor(None, function, *args)
+
+    @staticmethod
+    def _read(file_name: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(file_name, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _write(directory: str, file_name: str, dumped: str):
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with open(file_name, 'w') as f:
+                f.write(dumped)
+        except OSError as e:
+            print(f"\nLLM cache write failed: {e}\n")
+
+    @staticmethod
+    def _remove(file_name: str):
+        try:
+            os.remove(file_name)
+        except OSError:
+            pass
+
+    @classmethod
+    def _sweep(cls, directory: str, ttl: float):
+        """ Files not written for ttl seconds only hold expired entries """
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return
+        oldest = time.time() - ttl
+        for name in names:
+            file_name = os.path.join(directory, name)
+            try:
+                if os.path.getmtime(file_name) < oldest:
+                    cls._remove(file_name)
+            except OSError:
+                pass
+
+    def stats(self) -> str:
+        return f"LLM response cache: {self.hits} hits, {self.misses} misses, " \
+               f"{len(self.entries)} prompts in memory"
+
+
+# Shared by all bots, the same opening prompt is seen by many players
+RESPONSE_CACHE = ResponseCache()
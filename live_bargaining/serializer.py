@@ -0,0 +1,141 @@
+""" JSON encoding of the JSON columns, offer records and channel frames
+
+orjson is used when it is installed, the standard library otherwise. Values
+orjson cannot encode (e.g. oTree's Currency, a Decimal) and texts it cannot
+decode (e.g. NaN) go to the standard library. orjson writes NaN and infinity
+as null, values with those are also encoded by the standard library, which
+writes NaN and Infinity as before. Compare both on the data of a full-length
+negotiation with:
+
+    python -m live_bargaining.serializer [turns] [repeat]
+"""
+import json
+import math
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+from sqlalchemy.sql import sqltypes as st
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKEND = 'orjson' if orjson is not None else 'json'
+
+
+def non_finite(value: Any) -> bool:
+    """ NaN or infinity anywhere in the value """
+    if isinstance(value, float):
+        return not math.isfinite(value)
+    if isinstance(value, dict):
+        return any(non_finite(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return any(non_finite(item) for item in value)
+    return False
+
+
+def dumps(value: Any, fallback: Callable[[Any], str] = json.dumps) -> str:
+    if orjson is not None:
+        try:
+            text = orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+            # Only then there can be a NaN or infinity written as null
+            if b'null' not in text or not non_finite(value):
+                return text.decode()
+        except TypeError:
+            pass
+    return fallback(value)
+
+
+def loads(text: str) -> Any:
+    if orjson is not None:
+        try:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(text)
+
+
+class JsonType(st.TypeDecorator):
+    """ JSON in a text column, encoded here instead of by the database driver """
+    impl = st.Text
+
+    def process_bind_param(self, value: Any, dialect) -> Any:
+        return None if value is None else dumps(value)
+
+    def process_result_value(self, value: Any, dialect) -> Any:
+        return None if value is None else loads(value)
+
+
+def patch_channels():
+    """ Frames of all live pages, oTree encodes each one per websocket """
+    from otree.channels import utils as channel_utils
+
+    json_dumps = channel_utils.json_dumps
+    channel_utils.json_dumps = lambda value: dumps(value, json_dumps)
+
+
+def negotiation(turns: int) -> Dict[str, List[Any]]:
+    """ What a negotiation of this many turns encodes and decodes """
+    from .offer import Offer
+    from .prompts import PROMPTS
+
+    prompt = ' '.join(value for value in PROMPTS.values()
+                      if isinstance(value, str))[:3000]
+    offers, chat, interactions, bot_vars, frames = [], [], [], [], []
+    for turn in range(turns):
+        offer = Offer(idx=turn % 2 + 1, price=8.5 - turn * 0.05,
+                      quality=40 + turn, stamp=1700000000 + turn * 20,
+                      from_chat=bool(turn % 3), profit_bot=120 + turn,
+                      profit_user=95 - turn)
+        offers.append(offer)
+        message = {'nick': 'Supplier (Me)' if turn % 2 else 'Buyer',
+                   'body': f"I propose a Wholesale Price of €{offer.price:.2f} "
+                           f"for {offer.quality} units. What do you think?"}
+        chat.append(message)
+        interactions += [{'role': 'user', 'content': prompt},
+                         {'role': 'system', 'content': message['body']}]
+        bot_vars.append({'constraint_user': 9, 'evaluation': 'interface',
+                         'turns': turn, 'optimal': [offer.price,
+                                                    offer.quality]})
+        frames.append({'chat_delta': {'seq': turn, 'items': [message]},
+                       'offers_delta': {'seq': turn, 'items': [offer]},
+                       'unblock': True})
+    return {'offers': offers, 'chat': chat, 'interactions': interactions,
+            'bot_vars': bot_vars, 'frames': frames}
+
+
+def benchmark(turns: int = 50, repeat: int = 100):
+    global orjson
+    fast = orjson
+    data = negotiation(turns)
+    for backend in ['json', 'orjson']:
+        if backend == 'orjson' and fast is None:
+            print("orjson: not installed")
+            continue
+        orjson = fast if backend == 'orjson' else None
+        line = []
+        for name, values in data.items():
+            texts = [dumps(value) for value in values]
+            start = time.perf_counter()
+            for _ in range(repeat):
+                for value in values:
+                    dumps(value)
+            encode = time.perf_counter() - start
+            start = time.perf_counter()
+            for _ in range(repeat):
+                for text in texts:
+                    loads(text)
+            decode = time.perf_counter() - start
+            assert [loads(text) for text in texts] == \
+                   json.loads(json.dumps(values))
+            line.append(f"{name} {encode / repeat * 1000:.2f}/"
+                        f"{decode / repeat * 1000:.2f}")
+        print(f"{backend}: ms encode/decode per negotiation of {turns} "
+              f"turns: {', '.join(line)}")
+    orjson = fast
+
+
+if __name__ == '__main__':
+    benchmark(*[int(arg) for arg in sys.argv[1:3]])
@@ -1,85 +1,78 @@
-import asyncio
-import time
-from typing import List, Dict
+from typing import List, Optional
 
 import requests
 from otree.database import db
 from otree.models import Session
 from requests.auth import HTTPBasicAuth
 
-from .constants import C
-from .models import SessionCounter
+from .fair_queue import FairQueue, PRIORITY_GENERATE
+from .models import DebugLog, SessionCounter
 
-LLM_HOSTS: Dict[str, asyncio.Queue] = {}
+# One pool of host slots for all sessions, so they share capacity fairly
+LLM_HOSTS = FairQueue()
 
 
 class Queues:
-    @classmethod
-    async def create_queues(cls, code: str, llm_hosts: List[str]):
-        print()
-        print(f"Adding {len(llm_hosts)}")
-        for llm_host in llm_hosts:
-            print(llm_host)
-        print()
-
-        for round_number in range(1, C.NUM_ROUNDS + 1):
-            key = f"{code}_{round_number}"
-            LLM_HOSTS[key] = asyncio.Queue()
-            for llm_host in llm_hosts:
-                LLM_HOSTS[key].put_nowait(llm_host)
-
     @classmethod
     def add_hosts(cls, code: str, round_number: int):
         session = db.query(Session).filter_by(code=code).one()
-        key = f"{code}_{round_number}"
-        for llm_host in session.llm_hosts:
-            LLM_HOSTS[key].put_nowait(llm_host)
+        config = session.config
+        flow = LLM_HOSTS.add_flow(code, session.llm_hosts,
+                                  config.get('llm_host_slots', 1))
+        flow.weight = config.get('llm_share_weight', 1)
+        flow.per_participant = config.get('llm_fair_participants', False)
+        flow.aging = config.get('llm_priority_aging', flow.aging)
+        flow.boost_window = config.get('llm_deadline_boost', flow.boost_window)
 
     @classmethod
-    async def acquire(cls, code: str, round_number: int):
-        key = f"{code}_{round_number}"
-
-        if key not in LLM_HOSTS:
-            LLM_HOSTS[key] = asyncio.Queue()
+    async def acquire(cls, code: str, round_number: int, timeout: float = 90,
+                      participant: str = '', priority: int = PRIORITY_GENERATE,
+                      deadline: float = None,
+                      preferred: str = None) -> Optional[str]:
+        if code not in LLM_HOSTS.flows:
             cls.add_hosts(code, round_number)
 
-        llm_host = None
-        end_time = time.time() + 90
-        while time.time() <= end_time and llm_host is None:
-            try:
-                llm_host = LLM_HOSTS[key].get_nowait()
-            except asyncio.QueueEmpty:
-                await asyncio.sleep(.5)
+        return await LLM_HOSTS.acquire(
+            code, participant, timeout, priority, deadline, preferred)
 
-        return llm_host
+    @classmethod
+    def try_acquire(cls, code: str, round_number: int,
+                    exclude: str = None) -> Optional[str]:
+        """ An idle host with a closed circuit (or due a probe), or None """
+        return LLM_HOSTS.try_acquire(code, exclude)
 
     @classmethod
     async def release(cls, code: str, round_number: int, llm_host: str):
-        key = f"{code}_{round_number}"
         try:
-            prev = LLM_HOSTS[key].qsize()
-            LLM_HOSTS[key].put_nowait(llm_host)
-            assert LLM_HOSTS[key].qsize() == prev + 1
+            LLM_HOSTS.release(llm_host)
         except Exception as e:
             print()
             print('RELEASE ERROR', e)
 
+    @classmethod
+    def stats(cls, code: str) -> List[str]:
+        flows = LLM_HOSTS.flows
+        if code not in flows:
+            return []
+        # This session first, other sessions show whom it competes with
+        return [flows[code].stats()] + \
+            [flow.stats() for key, flow in flows.items() if key != code]
+
 
 class SessionPatch:
     def __init__(self):
         # Only here to get rid of annoying PyCharm errors
         self.code = None
         self.config = None
-        self.debug_log = None
         self.llm_hosts = None
         raise RuntimeError
 
     def initialize(self):
         SessionCounter.add_code(self.code)
-        self.debug_log = {i: [] for i in range(C.NUM_ROUNDS + 1)}
         llm_hosts = [llm_host for llm_host, enabled in self.config.items()
                      if llm_host.startswith(("http://", "https://")) and
                      enabled is True and self.test_host(llm_host)]
+        DebugLog.flush(self.code, 0)
         if not llm_hosts:
             raise NoServersException("\n\nNo LLM hosts available!\n")
 
@@ -99,9 +92,9 @@ class SessionPatch:
             available = False
 
         if available:
-            self.debug_log[0].append(f"LLM server available     {llm_host}")
+            DebugLog.add(self.code, 0, f"LLM server available     {llm_host}")
         else:
-            self.debug_log[0].append(f"LLM server NOT available {llm_host}")
+            DebugLog.add(self.code, 0, f"LLM server NOT available {llm_host}")
 
         return available
 
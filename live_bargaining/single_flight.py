@@ -0,0 +1,54 @@
+import asyncio
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Dict
+
+
+class Flight:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+# Shared by all bots, identical requests can come from different players
+IN_FLIGHT: Dict[str, Flight] = {}
+
+
+class SingleFlight:
+    """ Concurrent identical LLM requests share one call (and host lease) """
+    calls = 0
+    coalesced = 0
+
+    @staticmethod
+    def key(**kwargs) -> str:
+        dumped = json.dumps(kwargs, sort_keys=True, default=str)
+        return hashlib.sha256(dumped.encode()).hexdigest()
+
+    @classmethod
+    async def run(cls, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        cls.calls += 1
+        flight = IN_FLIGHT.get(key)
+        if flight is None:
+            flight = Flight(asyncio.ensure_future(factory()))
+            IN_FLIGHT[key] = flight
+
+            def done(_):
+                if IN_FLIGHT.get(key) is flight:
+                    del IN_FLIGHT[key]
+            flight.task.add_done_callback(done)
+        else:
+            cls.coalesced += 1
+
+        flight.waiters += 1
+        try:
+            # Shielded, one waiter leaving must not cancel it for the others
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+
+    @classmethod
+    def stats(cls) -> str:
+        return f"LLM single flight: {cls.calls} calls, " \
+               f"{cls.coalesced} coalesced, {len(IN_FLIGHT)} in flight"
@@ -29,8 +29,11 @@ document.addEventListener('DOMContentLoaded', () => {
       liveSend({'type': 'initial'});
     }, 1000);
   }
+  // Full snapshot on page load, live frames only carry new items
   receiveMessage(js_vars.messages);
   receiveoffers(js_vars.offers);
+  chatSeq = js_vars.messages.length;
+  offersSeq = js_vars.offers.length;
 
   // Always disable offer button on (re)loading of page
   btnOffer.disabled = true;
@@ -48,6 +51,17 @@ document.addEventListener('DOMContentLoaded', () => {
   setInterval(() => {
     liveSend({'type': 'ping'});
   }, 1000);
+
+  // Catch up on frames missed while the socket was reconnecting
+  if (typeof liveSocket !== 'undefined' && liveSocket.addEventListener) {
+    liveSocket.addEventListener('open', requestResync);
+  }
+  window.addEventListener('online', requestResync);
+  document.addEventListener('visibilitychange', () => {
+    if (!document.hidden) {
+      requestResync();
+    }
+  });
   
   // Initialize Decision Support System
   initializeDecisionSupport();
@@ -57,11 +71,19 @@ function liveRecv(data) {
   if ('finished' in data) {
     document.getElementById('form').submit();
   }
-  if ('chat' in data) {
-    receiveMessage(data.chat);
+  if ('chat_delta' in data) {
+    let messages = newItems(data.chat_delta, chatSeq);
+    if (messages !== null) {
+      chatSeq += messages.length;
+      appendMessages(messages);
+    }
   }
-  if ('offers' in data) {
-    receiveoffers(data.offers);
+  if ('offers_delta' in data) {
+    let offers = newItems(data.offers_delta, offersSeq);
+    if (offers !== null) {
+      offersSeq += offers.length;
+      receiveoffers(offers);
+    }
   }
   if ('unblock' in data) {
     console.log("UNBLOCK received!");
@@ -69,6 +91,27 @@ function liveRecv(data) {
   }
 }
 
+////////////////////////////////////////////////////////////////////////////////
+// Live protocol
+////////////////////////////////////////////////////////////////////////////////
+// Number of chat messages and offers received, the sequence of the next one
+let chatSeq = 0;
+let offersSeq = 0;
+
+function newItems(delta, seq) {
+  // A gap, frames were missed: ask for everything from seq
+  if (delta.seq > seq) {
+    requestResync();
+    return null;
+  }
+  // Drop items already received, e.g. a resync crossing a live frame
+  return delta.items.slice(seq - delta.seq);
+}
+
+function requestResync() {
+  liveSend({'type': 'resync', 'chat': chatSeq, 'offers': offersSeq});
+}
+
 ////////////////////////////////////////////////////////////////////////////////
 // Decision Support System
 ////////////////////////////////////////////////////////////////////////////////
@@ -389,18 +432,16 @@ function blockUnblock(block) {
   myPrice.placeholder="Price here..."
 }
 
-function unblockAfterMessage() {
+function unblockAfterMessage(messages) {
   if (js_vars.bot_opponent !== true) {
     return;
   }
-  let nicks = chatOutput.getElementsByClassName('otree-chat__nickname');
-
-  blockCount = 0;
-  Array.from(nicks).forEach((n) => {
-    blockCount += n.innerHTML.includes("(Me)");
+  // Only the new messages, blockCount counts on
+  messages.forEach((message) => {
+    blockCount += message['nick'].includes("(Me)");
   });
 
-  let lastNick = nicks[nicks.length - 1].innerHTML;
+  let lastNick = messages[messages.length - 1]['nick'];
   if (!lastNick.includes("(Me)")) {
     blockUnblock(false);
   }
@@ -547,26 +588,43 @@ function sendMessage() {
   blockUnblock(true);
 }
 
-function receiveMessage(messages) {
-  let messagesHTML = '';
-  messages.forEach((message) => {
-    let nick = escapeHtml(message['nick']);
-    let body = escapeHtml(message['body']).replaceAll('\n', '<br>');
-    messagesHTML += "<div class='otree-chat__msg'>" +
-        "<span class='otree-chat__nickname'>" + nick + "</span>" +
-        "<span class='otree-chat__body'>" + body + "</span>" +
-        "</div>";
-  });
-  messagesHTML += "<div class='otree-chat__msg'>&nbsp;</div>";
-  chatOutput.innerHTML = messagesHTML;
+function messageHTML(message) {
+  let nick = escapeHtml(message['nick']);
+  let body = escapeHtml(message['body']).replaceAll('\n', '<br>');
+  return "<div class='otree-chat__msg'>" +
+      "<span class='otree-chat__nickname'>" + nick + "</span>" +
+      "<span class='otree-chat__body'>" + body + "</span>" +
+      "</div>";
+}
+
+function scrollChat() {
   chatOutput.scrollTo({
     top: chatOutput.scrollHeight,
     left: 0,
     behavior: "smooth",
   });
+}
+
+function receiveMessage(messages) {
+  let messagesHTML = messages.map(messageHTML).join('');
+  messagesHTML += "<div class='otree-chat__msg'>&nbsp;</div>";
+  chatOutput.innerHTML = messagesHTML;
+  scrollChat();
+  blockCount = 0;
   if (messages.length > 0) {
-    unblockAfterMessage();
+    unblockAfterMessage(messages);
+  }
+}
+
+function appendMessages(messages) {
+  if (messages.length === 0) {
+    return;
   }
+  // Before the empty line at the end
+  chatOutput.lastElementChild.insertAdjacentHTML(
+      'beforebegin', messages.map(messageHTML).join(''));
+  scrollChat();
+  unblockAfterMessage(messages);
 }
 
 function escapeHtml(string) {
@@ -0,0 +1,86 @@
+import random
+from typing import Dict, List
+
+from .constants import C
+from .offer import (ACCEPT, OFFER_QUALITY, OFFER_PRICE, NOT_OFFER,
+                    INVALID_OFFER, NOT_PROFITABLE_FIND_OTHER_QUANTITY,
+                    NOT_PROFITABLE_FIND_OTHER_PRICE, TOO_UNFAVOURABLE)
+
+ACCEPT_FROM_CHAT = 'accept_from_chat'
+
+# Replies without LLM, per bot role and evaluation of the user offer.
+# {price} and {quantity} are the counteroffer of the bot.
+COMMON = {
+    ACCEPT: [
+        "That works for me, thank you for your understanding. We have a deal.",
+        "Thank you, those terms are acceptable to me. Let's close the deal.",
+    ],
+    ACCEPT_FROM_CHAT: [
+        "That works for me, thank you for your understanding. Please click "
+        "the CONFIRM button below the SEND button to seal the deal.",
+        "Thank you, those terms are acceptable. Please click the CONFIRM "
+        "button, which can be found below the SEND button.",
+    ],
+    OFFER_PRICE: [
+        "At that Wholesale Price, I propose a Quantity of {quantity} units: "
+        "€{price:.2f} for {quantity} units.",
+        "For €{price:.2f} per unit, {quantity} units would work for me.",
+    ],
+    NOT_PROFITABLE_FIND_OTHER_QUANTITY: [
+        "I can accept that Wholesale Price with a different Quantity: "
+        "€{price:.2f} for {quantity} units.",
+        "Let's keep €{price:.2f} per unit, but make it {quantity} units.",
+    ],
+    OFFER_QUALITY: [
+        "For {quantity} units, I propose a Wholesale Price of €{price:.2f}.",
+        "{quantity} units would work for me at €{price:.2f} per unit.",
+    ],
+    NOT_PROFITABLE_FIND_OTHER_PRICE: [
+        "I can accept {quantity} units, but at a Wholesale Price of "
+        "€{price:.2f}.",
+        "Let's keep {quantity} units, at €{price:.2f} per unit.",
+    ],
+    INVALID_OFFER: [
+        f"That offer is outside the possible range. Prices go from "
+        f"€{C.PRICE_RANGE[0]:g} to €{C.PRICE_RANGE[-1]:g} and Quantities "
+        f"from {C.QUALITY_RANGE[0]} to {C.QUALITY_RANGE[-1]}. "
+        "I propose €{price:.2f} for {quantity} units.",
+    ],
+}
+
+REPLIES: Dict[str, Dict[str, List[str]]] = {
+    C.ROLE_BUYER: {
+        **COMMON,
+        NOT_OFFER: [
+            "As the Retailer, I propose a Wholesale Price of €{price:.2f} "
+            "for {quantity} units. What do you think?",
+            "How about €{price:.2f} per unit for {quantity} units?",
+        ],
+        TOO_UNFAVOURABLE: [
+            "Those terms are too unfavourable for me as the Retailer. I can "
+            "offer €{price:.2f} for {quantity} units.",
+            "I cannot go that far. My offer is €{price:.2f} for {quantity} "
+            "units.",
+        ],
+    },
+    C.ROLE_SUPPLIER: {
+        **COMMON,
+        NOT_OFFER: [
+            "As the Supplier, I propose a Wholesale Price of €{price:.2f} "
+            "for {quantity} units. What do you think?",
+            "How about €{price:.2f} per unit for {quantity} units?",
+        ],
+        TOO_UNFAVOURABLE: [
+            "Those terms do not cover my production costs as the Supplier. I "
+            "can offer €{price:.2f} for {quantity} units.",
+            "I cannot go that far. My offer is €{price:.2f} for {quantity} "
+            "units.",
+        ],
+    },
+}
+
+
+def templated_reply(role: str, label: str,
+                    price: float = None, quantity: int = None) -> str:
+    template = random.choice(REPLIES[role][label])
+    return template.format(price=price, quantity=quantity)
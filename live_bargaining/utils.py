@@ -1,4 +1,5 @@
 from datetime import datetime
+from typing import Optional
 
 FORMAT = "%Y-%m-%d %H:%M:%S"
 
@@ -9,3 +10,16 @@ def now_datetime() -> str:
 
 def get_start_time(player: 'Player') -> datetime:
     return datetime.strptime(player.time_start, FORMAT)
+
+
+def get_timeout_seconds(player: 'Player') -> int:
+    if player.round_number == 1:
+        return player.session.config['timeout_bargain_round1']
+    return player.session.config['timeout_bargain']
+
+
+def get_deadline(player: 'Player') -> Optional[float]:
+    """ Epoch seconds at which the Bargain page of this round times out """
+    if player.field_maybe_none('time_start') is None:
+        return None
+    return get_start_time(player).timestamp() + get_timeout_seconds(player)
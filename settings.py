@@ -45,6 +45,72 @@ SESSION_CONFIG_DEFAULTS = {
     'llm_temp': 0.1,
     'llm_reader': 'reader',
     'llm_constraint': 'constrain_reader',
+    # Seconds before a single LLM call fails (None means wait forever)
+    'llm_timeout': 60,
+    # Duplicate a call on an idle host once it exceeds the host's p95 latency
+    'llm_hedging': False,
+    # Stop routing to a host after this many errors, probe after cooldown
+    'llm_breaker_failures': 3,
+    'llm_breaker_cooldown': 30,
+    # Concurrent calls per host, shared by all running sessions
+    'llm_host_slots': 1,
+    # Relative share of host capacity when several sessions run at once
+    'llm_share_weight': 1,
+    # Also share fairly between participants within this session
+    'llm_fair_participants': False,
+    # Seconds a waiting LLM call needs to move up one priority class
+    'llm_priority_aging': 10,
+    # Calls of participants with less seconds left in the round jump ahead
+    'llm_deadline_boost': 30,
+    # Concurrent identical LLM requests share a single call
+    'llm_single_flight': True,
+    # Reader calls (interpret offer/constraint) of a session arriving within
+    # llm_batch_window seconds share one host lease, sent in parallel
+    'llm_micro_batch': False,
+    'llm_batch_window': 0.005,
+    'llm_batch_size': 8,
+    # Reuse chat replies for identical prompts (memory LRU + disk)
+    'llm_cache': False,
+    'llm_cache_dir': 'llm_cache',
+    'llm_cache_size': 1000,
+    'llm_cache_ttl': 7 * 24 * 60 * 60,
+    # Number of replies generated per prompt before the stored ones (the
+    # different ones among them) are used in turn
+    'llm_cache_variety': 3,
+    # Last interactions in the prompt verbatim, older ones are summarized
+    'llm_context_turns': 8,
+    # Approximate token budget for the conversation history in a prompt
+    'llm_context_tokens': 2000,
+    'llm_summarize': True,
+    # Keep models (and their evaluated system prompt) loaded on the hosts
+    'llm_keep_alive': '30m',
+    # Evaluate the system prompt on a host when the bot greets
+    'llm_warm_up': True,
+    # Without a host within this many seconds, answer from numbers and
+    # templates instead of the LLM
+    'llm_degraded_mode': False,
+    'llm_degraded_budget': 10,
+    # Answer acceptances and invalid offers from prompts/phrasings.json
+    # (python -m live_bargaining.phrasings <llm_host> <count>)
+    'llm_fast_accept': False,
+    'llm_fast_invalid': False,
+    # Compute the counteroffer and let the LLM phrase it in one call,
+    # instead of picking the best of up to three generations
+    'llm_counteroffer_engine': False,
+    # Learn per evaluation, model and role how many candidates to generate
+    # and which prompt to use, from all previous sessions
+    'llm_adaptive_candidates': False,
+    'llm_candidates_min_samples': 20,
+    # Stop before a candidate position that is very likely accepted less often
+    'llm_candidates_min_rate': 0.05,
+    # Share of turns that try all candidates with random prompts, so the
+    # history of positions that were cut stays up to date
+    'llm_candidates_explore': 0.1,
+    # Inserts of the bots on a separate thread and session (not for SQLite)
+    'db_writer_thread': False,
+    # Bot updates within this many seconds go out as one frame, the rest at
+    # the end of the turn (0 sends each update at once)
+    'channel_flush_window': 0.05,
 
     "https://ollama1.src-automating.src.surf-hosted.nl": True,
     "https://ollama2.src-automating.src.surf-hosted.nl": False,
@@ -134,6 +200,13 @@ if hostname in LOCAL_NAMES:
     else:
         tmp["http://localhost:11434"] = True
 
+# Local stand-in hosts (python -m live_bargaining.fake_ollama), e.g. 11434,11435
+if environ.get('FAKE_OLLAMA'):
+    for key in [k for k in tmp.keys() if k.startswith('http')]:
+        tmp[key] = False
+    for port in environ['FAKE_OLLAMA'].split(','):
+        tmp[f"http://localhost:{port.strip()}"] = True
+
 SESSION_CONFIGS = [
     dict(
         name='live_bargaining',
@@ -157,7 +230,7 @@ SESSION_CONFIGS = [
 ]
 
 PARTICIPANT_FIELDS = []
-SESSION_FIELDS = ['debug_log', 'llm_hosts']
+SESSION_FIELDS = ['llm_hosts']
 
 # ISO-639 code
 # for example: de, fr, ja, ko, zh-hans
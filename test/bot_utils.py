@@ -11,6 +11,7 @@ from otree.models import Participant
 
 from live_bargaining.offer import Offer, OfferList
 from live_bargaining.pareto import pareto_efficient_offer
+from live_bargaining.post_process import post_process
 from live_bargaining.prompts import PROMPTS
 from .constants import C, Config
 from .utils import log_llm_response, log_constraints, log_interpret, log_removed
@@ -88,56 +89,11 @@ class BotUtils:
             print(f"\nUnexpected response format: {response}\n")
             return f"\nUnexpected response format: {response}\n"
 
-        org = content
-        removed = ""
-
-        # Remove text before the first colon
-        if ':' in content:
-            removed = "[:]" + content.split(':')[0].strip()
-            content = content.split(':', 1)[1].strip()
-
-        # Split the content at line breaks and take only the first part
-        if '\n' in content:
-            if removed:
-                removed += "\n"
-            removed += "[EOL]" + content.split('\n', 1)[1]
-            content = content.split('\n', 1)[0]
-
-        # Extract text within the quotes if quotes are found
-        start = content.find('"') + 1
-        end = content.rfind('"')
-        if 0 < start < end:
-            if removed:
-                removed += "\n"
-            removed += "[Q1]" + content[:start] + "\n[Q2]" + content[end:]
-            content = content[start:end]
-        else:
-            # Remove text within parentheses if no quotes are found
-            while '(' in content and ')' in content:
-                start = content.find('(')
-                end = content.find(')', start) + 1
-                if 0 <= start < end:
-                    if removed:
-                        removed += "\n"
-                    removed += "[B]" + content[start:end]
-                    content = content[:start] + content[end:]
-
-        # Remove 'System" starts
-        if content.lower().startswith("system:"):
-            if removed:
-                removed += "\n"
-            removed += "[SYS]" + content[:7]
-            content = content[7:].strip()
-        if content.lower().startswith("system,"):
-            if removed:
-                removed += "\n"
-            removed += "[SYS]" + content[:7]
-            content = content[7:].strip()
-
+        final, removed = post_process(content, 'test')
         if removed:
-            log_removed(org, content.strip(), removed)
+            log_removed(content, final, removed)
 
-        return content.strip()
+        return final
 
     def random_draw_constraint(self) -> int:
         # Randomly draw constraint for the user
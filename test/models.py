@@ -4,20 +4,20 @@ from typing import Any, Dict, List, Union
 
 from otree.api import *
 from otree.database import db, wrap_column, AUTO_SUBMIT_DEFAULTS, OTreeColumn
-from sqlalchemy.sql import sqltypes as st
 
 from live_bargaining.offer import Offer
+from live_bargaining.serializer import JsonType
 from live_bargaining.utils import now_datetime
 from .bot_negotiation import NegotiationBot
 from .constants import C
 from .utils import reset_logs
 
-AUTO_SUBMIT_DEFAULTS[st.JSON] = None
+AUTO_SUBMIT_DEFAULTS[JsonType] = None
 
 
 # Do not user .append / += [] (list), .update (dict) or form_fields!
 def JsonField(**kwargs) -> OTreeColumn:
-    return wrap_column(st.JSON, **kwargs)
+    return wrap_column(JsonType, **kwargs)
 
 
 class Subsession(BaseSubsession):
@@ -0,0 +1,23 @@
+""" Tests need oTree installed (requirements.txt), run from the project root:
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+os.environ['OTREE_IN_MEMORY'] = '1'
+
+
+@pytest.fixture(scope='session')
+def otree_db():
+    """ oTree with an in-memory database and no LLM host checks """
+    from otree.main import setup
+    setup()
+
+    from otree.models import Session
+    Session.test_host = lambda self, llm_host: True
@@ -0,0 +1,29 @@
+import importlib
+from collections import Counter
+
+
+def test_select_profits_one_per_round_and_role(otree_db):
+    from otree.database import db
+    from otree.session import create_session
+    models = importlib.import_module('live_bargaining.models')
+    BotProfits = models.BotProfits
+
+    session = create_session('live_bargaining', num_participants=2)
+    subsessions = session.get_subsessions()
+    for sub_session in subsessions[1:4]:
+        for profit in range(4):
+            BotProfits.update(sub_session, 'Buyer', profit)
+        BotProfits.update(sub_session, 'Supplier', 10)
+    db.commit()
+
+    BotProfits.select_profits(subsessions[0].get_groups()[0])
+    db.expire_all()
+
+    rows = db.query(BotProfits).join(models.Subsession) \
+        .filter(models.Subsession.session_id == session.id).all()
+    selected = Counter((row.sub_session.round_number, row.role)
+                       for row in rows if row.selected)
+    # Round 2 is not paid
+    assert selected == {(round_number, role): 1
+                        for round_number in (3, 4)
+                        for role in ('Buyer', 'Supplier')}
@@ -0,0 +1,69 @@
+import random
+from typing import Dict, List, Tuple
+
+import pytest
+
+from live_bargaining.candidate_budget import CandidateStats, DEFAULT_PLAN
+from live_bargaining.constants import Config
+from settings import SESSION_CONFIG_DEFAULTS
+
+# Chance that a candidate is acceptable, per prompt variant and per position
+# after the earlier ones failed. At a low temperature a repeated prompt
+# mostly repeats its mistake.
+SCENARIOS: Dict[str, Dict[int, List[float]]] = {
+    'right first time': {1: [.9, .02, .02], 2: [.8, .05, .05]},
+    'often wrong': {1: [.3, .25, .25], 2: [.35, .3, .3]},
+    'variant 2 better': {1: [.2, .05, .05], 2: [.6, .4, .4]},
+    'rarely right': {1: [.08, .08, .08], 2: [.08, .08, .08]},
+}
+
+
+def simulate(scenario: Dict[int, List[float]], adaptive: bool,
+             config: Config, turns: int) -> Tuple[float, float]:
+    """ Acceptance rate and LLM calls per turn """
+    stats = CandidateStats()
+    accepted_turns = calls = 0
+    for _ in range(turns):
+        plan = stats.plan(config, random.random()) if adaptive \
+            else DEFAULT_PLAN
+        for position, variant in enumerate(plan, 1):
+            calls += 1
+            accepted = random.random() < scenario[variant][position - 1]
+            stats.add(position, variant, accepted)
+            if accepted:
+                accepted_turns += 1
+                break
+    return accepted_turns / turns, calls / turns
+
+
+@pytest.mark.parametrize('name', SCENARIOS)
+def test_adaptive_plan_accepts_as_often(name):
+    """ Only positions accepted less often than llm_candidates_min_rate may
+    be cut, in the scenarios that costs less than a percent """
+    random.seed(0)
+    scenario = SCENARIOS[name]
+    fixed_rate, fixed_calls = simulate(
+        scenario, False, SESSION_CONFIG_DEFAULTS, 50000)
+    rate, calls = simulate(scenario, True, SESSION_CONFIG_DEFAULTS, 50000)
+    assert rate >= fixed_rate - 0.01
+    assert calls <= fixed_calls + 0.01
+
+
+def test_stats_from_history(otree_db):
+    from otree.database import db
+    from live_bargaining import candidate_budget
+    from live_bargaining.candidate_budget import CandidateHistory
+
+    key = ('respond', 'llama3', 'Buyer')
+    for position, variant, accepted in [(1, 1, False), (2, 1, True),
+                                        (1, 1, True), (1, 2, False)]:
+        db.add(CandidateHistory.record(key, position, variant, accepted))
+    db.commit()
+
+    # As after a restart
+    candidate_budget.CANDIDATE_STATS.clear()
+    stats = CandidateHistory.stats(key)
+    assert stats.reached[:2] == [3, 1]
+    assert stats.accepted[:2] == [1, 1]
+    assert stats.variant_tries == {1: 3, 2: 1}
+    assert stats.variant_accepted == {1: 2, 2: 0}
@@ -0,0 +1,36 @@
+import importlib
+
+
+def test_flush_writes_only_its_own_key(otree_db):
+    from otree.database import db
+    debug_log = importlib.import_module('live_bargaining.debug_log')
+    DebugLog = debug_log.DebugLog
+
+    DebugLog.add('s1', 1, 'one')
+    DebugLog.add('s2', 1, 'other session')
+    DebugLog.add('s1', 1, 'two')
+    DebugLog.flush('s1', 1)
+    db.commit()
+
+    rows = db.query(DebugLog.session_code, DebugLog.message) \
+        .filter(DebugLog.session_code.in_(['s1', 's2'])) \
+        .order_by(DebugLog.id).all()
+    assert rows == [('s1', 'one'), ('s1', 'two')]
+    assert debug_log.PENDING[('s2', 1)] == ['other session']
+
+
+def test_ring_loads_the_last_lines(otree_db):
+    from otree.database import db
+    debug_log = importlib.import_module('live_bargaining.debug_log')
+    DebugLog = debug_log.DebugLog
+
+    count = debug_log.RING_SIZE + 10
+    for number in range(count):
+        DebugLog.add('s3', 1, str(number))
+    DebugLog.flush('s3', 1)
+    db.commit()
+
+    # As after a restart
+    del debug_log.RINGS[('s3', 1)]
+    assert DebugLog.lines('s3', 1) == [
+        str(number) for number in range(10, count)]
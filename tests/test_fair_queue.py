@@ -0,0 +1,39 @@
+import asyncio
+
+from live_bargaining.fair_queue import FairQueue
+
+
+def test_release_skips_cancelled_waiter():
+    async def run():
+        queue = FairQueue()
+        queue.add_flow('s1', ['h1'], slots=1)
+        llm_host = await queue.acquire('s1', 'p1', 1)
+        assert llm_host == 'h1'
+
+        task = asyncio.ensure_future(queue.acquire('s1', 'p2', 10))
+        await asyncio.sleep(0)
+        # What wait_for does on a timeout or cancel, before the except
+        # branch of acquire removes the waiter
+        waiter, = queue.flows['s1'].queues['']
+        waiter.future.cancel()
+        queue.release(llm_host)
+        assert queue.free_slots == {'h1': 1}
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        assert queue.free_slots == {'h1': 1}
+
+        assert await queue.acquire('s1', 'p3', 1) == 'h1'
+
+    asyncio.run(run())
+
+
+def test_release_skips_timed_out_waiter():
+    async def run():
+        queue = FairQueue()
+        queue.add_flow('s1', ['h1'], slots=1)
+        llm_host = await queue.acquire('s1', 'p1', 1)
+        assert await queue.acquire('s1', 'p2', 0.01) is None
+        queue.release(llm_host)
+        assert await queue.acquire('s1', 'p3', 1) == 'h1'
+
+    asyncio.run(run())
@@ -0,0 +1,11 @@
+def test_write_inserts_then_updates(otree_db):
+    from otree.database import db
+    from live_bargaining.heartbeat import Heartbeat, LastPing
+
+    Heartbeat.write({'p1': 100, 'p2': 100})
+    Heartbeat.write({'p2': 130, 'p3': 130})
+    db.commit()
+
+    rows = db.query(LastPing.participant_code, LastPing.timestamp) \
+        .order_by(LastPing.participant_code).all()
+    assert rows == [('p1', 100), ('p2', 130), ('p3', 130)]
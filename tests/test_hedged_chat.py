@@ -0,0 +1,30 @@
+import asyncio
+
+from live_bargaining.bot_llm import BotLLM
+from live_bargaining.host_health import HostHealth
+
+
+class SlowBot(BotLLM):
+    """ Bot of which every call hangs until it is cancelled """
+    def __init__(self):
+        self.config = {'llm_hedging': True}
+        self.calls = []
+
+    async def _timed_chat(self, llm_host, backup=False, **kwargs):
+        call = asyncio.get_running_loop().create_future()
+        self.calls.append(call)
+        return await call
+
+
+def test_cancel_during_wait_cancels_primary():
+    async def run():
+        HostHealth.get('slow').latencies.extend([60.] * HostHealth.MIN_SAMPLES)
+        bot = SlowBot()
+        turn = asyncio.ensure_future(bot._hedged_chat('slow', model='m'))
+        await asyncio.sleep(0.01)
+        turn.cancel()
+        await asyncio.gather(turn, return_exceptions=True)
+        call, = bot.calls
+        assert call.cancelled()
+
+    asyncio.run(run())
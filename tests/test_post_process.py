@@ -0,0 +1,11 @@
+from live_bargaining.post_process import check_corpus, pipeline_for
+
+
+def test_corpus():
+    assert check_corpus(repeat=1)
+
+
+def test_pipeline_for_model_with_tag():
+    assert pipeline_for('deepseek-r1:8b') == 'reasoning'
+    assert pipeline_for('llama3') == 'default'
+    assert pipeline_for(None) == 'default'
@@ -0,0 +1,47 @@
+import asyncio
+
+from live_bargaining.response_cache import ResponseCache
+
+
+def config(tmp_path):
+    return {'llm_cache_dir': str(tmp_path), 'llm_cache_size': 10,
+            'llm_cache_ttl': 60, 'llm_cache_variety': 3}
+
+
+def test_identical_replies_hit(tmp_path):
+    """ At a low temperature every generation is the same reply """
+    async def run():
+        cache = ResponseCache()
+        key = cache.key('model', 0.1, [{'role': 'user', 'content': 'hi'}])
+        hits = 0
+        for _ in range(10):
+            cached = await cache.get(key, config(tmp_path))
+            if cached is None:
+                await cache.put(key, 'Hello', config(tmp_path))
+            else:
+                assert cached == 'Hello'
+                hits += 1
+        assert hits == 7
+
+    asyncio.run(run())
+
+
+def test_load_from_disk(tmp_path):
+    async def run():
+        cache = ResponseCache()
+        key = cache.key('model', 0.1, [])
+        for content in ['a', 'b', 'a']:
+            await cache.put(key, content, config(tmp_path))
+        # Let the worker threads write the file
+        file_name = str(tmp_path / f"{key}.json")
+        for _ in range(100):
+            entry = ResponseCache._read(file_name)
+            if entry and entry['generations'] == 3:
+                break
+            await asyncio.sleep(0.01)
+
+        fresh = ResponseCache()
+        assert [await fresh.get(key, config(tmp_path))
+                for _ in range(3)] == ['a', 'b', 'a']
+
+    asyncio.run(run())
@@ -0,0 +1,17 @@
+import math
+
+from live_bargaining.serializer import dumps, loads
+
+
+def test_non_finite_floats_survive():
+    value = {'price': float('nan'), 'profits': [float('inf'), 1.5],
+             'note': None}
+    decoded = loads(dumps(value))
+    assert math.isnan(decoded['price'])
+    assert decoded['profits'] == [float('inf'), 1.5]
+    assert decoded['note'] is None
+
+
+def test_null_without_non_finite_floats():
+    assert loads(dumps({'note': None, 'body': 'null'})) == \
+        {'note': None, 'body': 'null'}